@@ -0,0 +1,148 @@
+import asyncio
+import os
+import shutil
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functions import render_page, get_precompressor, get_asset_table, get_image_table
+from parallel import collect_page_jobs, resolve_workers, _init_worker
+
+
+def read_source(path):
+    with open(path, "r") as f:
+        return f.read()
+
+
+def write_output(dest_path, html):
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    tmp_path = dest_path + ".tmp"
+    try:
+        with open(tmp_path, "w") as d:
+            d.write(html)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def copy_file(src, dst):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    shutil.copy(src, dst)
+
+
+def _error(e):
+    return f"{type(e).__name__}: {e}"
+
+
+async def _read_stage(pages, render_queue, io_pool, errors, renderers):
+    loop = asyncio.get_running_loop()
+    # Start several reads at once, but never more than the render queue can take after them
+    pending = set()
+    for src, dst, template in pages:
+        print(f"Generating page from {src} to {dst} using {template}")
+        pending.add(asyncio.ensure_future(_read_one(loop, io_pool, src, dst, template)))
+        if len(pending) >= render_queue.maxsize:
+            pending = await _drain_reads(pending, render_queue, errors, asyncio.FIRST_COMPLETED)
+    if pending:
+        await _drain_reads(pending, render_queue, errors, asyncio.ALL_COMPLETED)
+    for _ in range(renderers):
+        await render_queue.put(None)
+
+
+async def _read_one(loop, io_pool, src, dst, template):
+    try:
+        return (src, dst, template, await loop.run_in_executor(io_pool, read_source, src)), None
+    except Exception as e:
+        return (src, dst, template, None), _error(e)
+
+
+async def _drain_reads(pending, render_queue, errors, return_when):
+    done, pending = await asyncio.wait(pending, return_when=return_when)
+    for future in done:
+        job, error = future.result()
+        if error is not None:
+            errors.append((job[0], error))
+            continue
+        # put() waits while the queue is full, which is what holds the readers back
+        await render_queue.put(job)
+    return pending
+
+
+async def _render_stage(render_queue, write_queue, render_pool, basepath, errors):
+    loop = asyncio.get_running_loop()
+    while True:
+        job = await render_queue.get()
+        if job is None:
+            return
+        src, dst, template, markdown = job
+        try:
+            html = await loop.run_in_executor(render_pool, render_page, markdown, template, basepath)
+        except Exception as e:
+            errors.append((src, _error(e)))
+            continue
+        await write_queue.put((src, dst, html))
+
+
+async def _write_stage(write_queue, io_pool, errors):
+    loop = asyncio.get_running_loop()
+    while True:
+        job = await write_queue.get()
+        if job is None:
+            return
+        src, dst, html = job
+        try:
+            await loop.run_in_executor(io_pool, write_output, dst, html)
+        except Exception as e:
+            errors.append((src, _error(e)))
+            continue
+        precompressor = get_precompressor()
+        if precompressor is not None:
+            precompressor.submit(dst)
+
+
+async def run_pipeline(pages, copies, basepath, workers=1, io_threads=8, queue_size=16):
+    # reader -> render_queue -> renderers -> write_queue -> writers; both queues are bounded,
+    # so at most about 2 * queue_size pages are held in memory whatever the size of the site
+    errors = []
+    render_queue = asyncio.Queue(maxsize=queue_size)
+    write_queue = asyncio.Queue(maxsize=queue_size)
+    workers = resolve_workers(workers)
+    # One render thread keeps the block cache single-threaded; more workers means real processes
+    if workers == 1:
+        render_pool = ThreadPoolExecutor(max_workers=1)
+    else:
+        render_pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(None, False, get_asset_table(), get_image_table()))
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=io_threads) as io_pool, render_pool:
+        copying = [loop.run_in_executor(io_pool, copy_file, src, dst) for src, dst in copies]
+        writers = [asyncio.ensure_future(_write_stage(write_queue, io_pool, errors)) for _ in range(io_threads)]
+        await asyncio.gather(
+            _read_stage(pages, render_queue, io_pool, errors, workers),
+            *(_render_stage(render_queue, write_queue, render_pool, basepath, errors) for _ in range(workers)),
+        )
+        for _ in writers:
+            await write_queue.put(None)
+        await asyncio.gather(*writers)
+        precompressor = get_precompressor()
+        for (src, dst), result in zip(copies, await asyncio.gather(*copying, return_exceptions=True)):
+            if isinstance(result, Exception):
+                errors.append((src, _error(result)))
+            elif precompressor is not None:
+                precompressor.submit(dst)
+    return sorted(errors)
+
+
+def generate_pages_async(dir_path_content, template_path, dest_dir_path, basepath, workers=1, io_threads=8, queue_size=16, include=None, exclude=None):
+    if not os.path.exists(dir_path_content):
+        raise ValueError(f"Error: dir_path_content '{dir_path_content}' does not exist!")
+    if not os.path.exists(template_path):
+        raise ValueError(f"Error: template_path '{template_path}' does not exist!")
+    if not os.path.isdir(dir_path_content):
+        raise ValueError(f"Error: {dir_path_content} does not point to a directory!")
+    if not os.path.isfile(template_path):
+        raise ValueError(f"Error: {template_path} does not point to a valid file!")
+    if queue_size < 1:
+        raise ValueError(f"Error: queue_size must be at least 1, got {queue_size}")
+
+    pages, copies = collect_page_jobs(dir_path_content, dest_dir_path, template_path, include, exclude)
+    return asyncio.run(run_pipeline(pages, copies, basepath, workers, io_threads, queue_size))
@@ -0,0 +1,62 @@
+import sys
+import timeit
+import tracemalloc
+
+from textnode import TextNode, TextType
+from htmlnode import LeafNode
+
+
+# Plain __dict__-backed copies of the node classes, to compare against the slotted ones
+class DictTextNode():
+    def __init__(self, text, text_type, url=None):
+        self.text = text
+        self.text_type = text_type if type(text_type) is TextType else TextType(text_type)
+        self.url = url
+
+
+class DictHTMLNode():
+    def __init__(self, tag=None, value=None, children=None, props=None):
+        self.tag = tag
+        self.value = value
+        self.children = children
+        self.props = props
+
+
+class DictLeafNode(DictHTMLNode):
+    def __init__(self, tag=None, value=None, props=None):
+        super().__init__(tag, value, props=props)
+
+
+def bytes_per_node(factory, count):
+    # The list is allocated up front so only the nodes themselves are measured
+    nodes = [None] * count
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        nodes[i] = factory(i)
+    total = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return total / count
+
+
+def construct_seconds(factory, count, repeat=5):
+    return min(timeit.repeat(lambda: [factory(i) for i in range(count)], number=1, repeat=repeat))
+
+
+def main(count=100000):
+    text = "shared text"
+    cases = [
+        ("TextNode", lambda i: TextNode(text, TextType.BOLD), lambda i: DictTextNode(text, TextType.BOLD)),
+        ("LeafNode", lambda i: LeafNode("b", text), lambda i: DictLeafNode("b", text)),
+    ]
+    print(f"{'node':<10}{'dict B/node':>14}{'slots B/node':>14}{'dict ms':>10}{'slots ms':>10}")
+    for name, slotted, plain in cases:
+        plain_bytes = bytes_per_node(plain, count)
+        slotted_bytes = bytes_per_node(slotted, count)
+        plain_ms = construct_seconds(plain, count) * 1000
+        slotted_ms = construct_seconds(slotted, count) * 1000
+        print(f"{name:<10}{plain_bytes:>14.1f}{slotted_bytes:>14.1f}{plain_ms:>10.1f}{slotted_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
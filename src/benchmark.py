@@ -0,0 +1,219 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from functions import markdown_to_html_node, text_to_textnodes, markdown_to_blocks, publish_static, generate_pages_recursive, _scan_inline
+
+
+SHAPES = ("mixed", "prose", "long_lists", "huge_code", "link_dense")
+TEMPLATE = '<!doctype html><html><head><title>{{ Title }}</title><link href="/index.css" rel="stylesheet" /></head><body><article>{{ Content }}</article></body></html>'
+WORDS = "the of and to in is was he for it with as his on be at by had are but from or have an they which one you were her all".split()
+
+
+def sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def inline_sentence(rng):
+    pieces = []
+    for _ in range(rng.randint(6, 14)):
+        roll = rng.random()
+        word = rng.choice(WORDS)
+        if roll < 0.08:
+            pieces.append(f"**{word}**")
+        elif roll < 0.14:
+            pieces.append(f"_{word}_")
+        elif roll < 0.18:
+            pieces.append(f"`{word}`")
+        elif roll < 0.22:
+            pieces.append(f"[{word}](/blog/{word})")
+        elif roll < 0.24:
+            pieces.append(f"![{word}](/images/{word}.png)")
+        else:
+            pieces.append(word)
+    return " ".join(pieces) + "."
+
+
+def generate_block(rng, shape):
+    if shape == "prose":
+        return "\n".join(sentence(rng) for _ in range(rng.randint(2, 6)))
+    if shape == "long_lists":
+        if rng.random() < 0.5:
+            return "\n".join(f"- {inline_sentence(rng)}" for _ in range(rng.randint(20, 80)))
+        return "\n".join(f"{i + 1}. {inline_sentence(rng)}" for i in range(rng.randint(20, 80)))
+    if shape == "huge_code":
+        return "```\n" + "\n".join(f"    line_{i} = compute({i})" for i in range(rng.randint(200, 600))) + "\n```"
+    if shape == "link_dense":
+        return " ".join(f"[{rng.choice(WORDS)}](/page/{rng.randint(0, 9999)})" for _ in range(rng.randint(20, 60)))
+    kind = rng.choice(["paragraph", "paragraph", "paragraph", "heading", "quote", "list", "ordered", "code"])
+    if kind == "heading":
+        return "#" * rng.randint(2, 4) + " " + inline_sentence(rng)
+    if kind == "quote":
+        return "\n".join(f"> {inline_sentence(rng)}" for _ in range(rng.randint(1, 4)))
+    if kind == "list":
+        return "\n".join(f"- {inline_sentence(rng)}" for _ in range(rng.randint(2, 8)))
+    if kind == "ordered":
+        return "\n".join(f"{i + 1}. {inline_sentence(rng)}" for i in range(rng.randint(2, 8)))
+    if kind == "code":
+        return "```\n" + "\n".join(f"x = {i}" for i in range(rng.randint(2, 10))) + "\n```"
+    return "\n".join(inline_sentence(rng) for _ in range(rng.randint(1, 5)))
+
+
+def prose_paragraphs(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(sentence(rng) for _ in range(rng.randint(2, 6))) for _ in range(count)]
+
+
+def generate_page_markdown(rng, shape, blocks=20):
+    parts = [f"# {sentence(rng, 5)}"]
+    parts.extend(generate_block(rng, shape) for _ in range(blocks))
+    return "\n\n".join(parts) + "\n"
+
+
+def generate_corpus(root, pages=1000, shape="mixed", depth=3, fanout=10, blocks=20, static_files=50, static_size=64 * 1024, seed=0):
+    # Lays out content/, static/ and template.html under root; the same arguments always give the same tree
+    rng = random.Random(seed)
+    content = os.path.join(root, "content")
+    static = os.path.join(root, "static")
+    for i in range(pages):
+        directory = content
+        for level in range(depth):
+            directory = os.path.join(directory, f"d{(i // fanout ** (level + 1)) % fanout}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"page{i}.md"), "w") as f:
+            f.write(generate_page_markdown(rng, shape, blocks))
+    os.makedirs(os.path.join(static, "images"), exist_ok=True)
+    for i in range(static_files):
+        with open(os.path.join(static, "images", f"img{i}.png"), "wb") as f:
+            f.write(rng.randbytes(static_size))
+    with open(os.path.join(static, "index.css"), "w") as f:
+        f.write("body { margin: 0 }\n")
+    with open(os.path.join(root, "template.html"), "w") as f:
+        f.write(TEMPLATE)
+    return content, static, os.path.join(root, "template.html")
+
+
+def read_corpus(content):
+    documents = []
+    for directory, _, files in os.walk(content):
+        for name in sorted(files):
+            with open(os.path.join(directory, name)) as f:
+                documents.append(f.read())
+    return documents
+
+
+def time_runs(func, repeat):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - started)
+    return {"best": min(runs), "mean": sum(runs) / len(runs), "runs": runs}
+
+
+def run_benchmarks(root, repeat=3, cases=None):
+    content, static, template = os.path.join(root, "content"), os.path.join(root, "static"), os.path.join(root, "template.html")
+    documents = read_corpus(content)
+    paragraphs = [block.replace("\n", " ") for document in documents for block in markdown_to_blocks(document) if block[0] not in "#`>-"]
+    trees = [markdown_to_html_node(document) for document in documents]
+    # Markup-free paragraphs, where text_to_textnodes can skip the scan entirely
+    prose = prose_paragraphs(max(len(paragraphs), 1000))
+    output = os.path.join(root, "out")
+
+    def full_build():
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            publish_static(static, output)
+            generate_pages_recursive(content, template, output, "/")
+
+    benchmarks = {
+        "markdown_to_html_node": lambda: [markdown_to_html_node(document) for document in documents],
+        "text_to_textnodes": lambda: [text_to_textnodes(paragraph) for paragraph in paragraphs],
+        "inline_prose": lambda: [text_to_textnodes(paragraph) for paragraph in prose],
+        "inline_prose_full_scan": lambda: [_scan_inline(paragraph) for paragraph in prose],
+        "to_html": lambda: [tree.to_html() for tree in trees],
+        "publish_static": lambda: publish_static(static, output),
+        "generate_pages_recursive": full_build,
+    }
+    results = {}
+    for name, func in benchmarks.items():
+        if cases and name not in cases:
+            continue
+        results[name] = time_runs(func, repeat)
+        print(f"{name:<26}{results[name]['best']:>10.4f}s best of {repeat}", file=sys.stderr)
+    if "inline_prose" in results and "inline_prose_full_scan" in results:
+        gain = results["inline_prose_full_scan"]["best"] / results["inline_prose"]["best"]
+        print(f"{'inline fast path':<26}{gain:>10.2f}x faster on prose without markup", file=sys.stderr)
+    return results
+
+
+def compare_results(previous, current, threshold):
+    # Returns the names whose best time got slower by more than threshold (0.1 = 10%)
+    regressions = []
+    for name, result in current["results"].items():
+        old = previous.get("results", {}).get(name)
+        if old is None:
+            continue
+        ratio = result["best"] / old["best"] if old["best"] else float("inf")
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{name:<26}{old['best']:>10.4f}s -> {result['best']:>8.4f}s  x{ratio:.2f} {flag}", file=sys.stderr)
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the build pipeline on a synthetic site.")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--shape", choices=SHAPES, default="mixed")
+    parser.add_argument("--depth", type=int, default=3, help="directory nesting of the content tree")
+    parser.add_argument("--blocks", type=int, default=20, help="markdown blocks per page")
+    parser.add_argument("--static-files", type=int, default=50)
+    parser.add_argument("--static-size", type=int, default=64 * 1024, help="bytes per static file")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--case", action="append", dest="cases", help="only run this benchmark (repeatable)")
+    parser.add_argument("--output", default="bench_output.json", help="where to write the results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown ratio counted as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as root:
+        generate_corpus(root, args.pages, args.shape, args.depth, blocks=args.blocks, static_files=args.static_files, static_size=args.static_size, seed=args.seed)
+        results = run_benchmarks(root, args.repeat, args.cases)
+
+    report = {
+        "meta": {
+            "pages": args.pages,
+            "shape": args.shape,
+            "depth": args.depth,
+            "blocks": args.blocks,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if compare_results(previous, report, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
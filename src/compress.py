@@ -0,0 +1,198 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULT_COMPRESS_STATE_PATH = os.path.join(".build_cache", "compress.json")
+DEFAULT_COMPRESS_STORE = os.path.join(".build_cache", "compressed")
+# Formats that are compressed already gain nothing from another pass
+ALREADY_COMPRESSED = frozenset((
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".ico",
+    ".woff", ".woff2", ".gz", ".br", ".zip", ".mp3", ".mp4", ".webm", ".pdf",
+))
+VARIANT_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+
+def available_formats():
+    return ("gzip", "br") if brotli is not None else ("gzip",)
+
+
+def compress_data(data, fmt):
+    if fmt == "gzip":
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+def remove_variants(path):
+    for suffix in VARIANT_SUFFIXES.values():
+        if os.path.isfile(path + suffix):
+            os.remove(path + suffix)
+
+
+def _tmp_path(path):
+    # Per thread, since two files with the same content share one stored variant
+    return f"{path}.{threading.get_ident()}.tmp"
+
+
+def _write_atomic(path, data):
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _copy_atomic(src, dst):
+    tmp_path = _tmp_path(dst)
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+class Precompressor():
+    # Writes .gz (and .br when the brotli module is installed) siblings on a thread pool;
+    # zlib and brotli release the GIL, so the threads really do compress in parallel.
+    # Variants are also kept in store_dir by content hash, so a full build that wiped docs/
+    # copies them back instead of compressing unchanged files again.
+    def __init__(self, formats=None, workers=4, state_path=None, store_dir=None, min_size=256):
+        self.formats = tuple(formats or available_formats())
+        missing = [fmt for fmt in self.formats if fmt not in available_formats()]
+        if missing:
+            raise ValueError(f"Error: compression format(s) not available: {', '.join(missing)}")
+        self.min_size = min_size
+        self.state_path = state_path
+        self.store_dir = store_dir
+        self.state = self.load_state(state_path)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+        self.lock = threading.Lock()
+        self.stats = {"compressed": 0, "reused": 0, "unchanged": 0, "bytes_in": 0, "bytes_out": 0}
+
+    @staticmethod
+    def load_state(state_path):
+        if state_path is None:
+            return {}
+        try:
+            with open(state_path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def wants(self, path):
+        return os.path.splitext(path)[1].lower() not in ALREADY_COMPRESSED
+
+    def submit(self, path):
+        if self.wants(path):
+            self.futures.append((path, self.pool.submit(self.compress_file, path)))
+
+    def has_variants(self, path):
+        return all(os.path.isfile(path + VARIANT_SUFFIXES[fmt]) for fmt in self.formats)
+
+    def compress_file(self, path):
+        key = os.path.abspath(path)
+        info = os.stat(path)
+        with self.lock:
+            entry = self.state.get(key)
+        # Same size and mtime as last time: trust the variants without reading the file
+        if entry is not None and entry["size"] == info.st_size and entry["mtime"] == info.st_mtime_ns and (info.st_size < self.min_size or self.has_variants(path)):
+            self.count("unchanged")
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if len(data) < self.min_size:
+            # Too small to be worth it; drop variants an older, bigger version left behind
+            remove_variants(path)
+        elif entry is not None and entry["hash"] == digest and self.has_variants(path):
+            self.count("unchanged")
+        else:
+            for fmt in self.formats:
+                self.place_variant(path, data, digest, fmt)
+        with self.lock:
+            self.state[key] = {"size": info.st_size, "mtime": info.st_mtime_ns, "hash": digest}
+
+    def stored_variant(self, digest, fmt):
+        if self.store_dir is None:
+            return None
+        return os.path.join(self.store_dir, digest + VARIANT_SUFFIXES[fmt])
+
+    def place_variant(self, path, data, digest, fmt):
+        variant = path + VARIANT_SUFFIXES[fmt]
+        stored = self.stored_variant(digest, fmt)
+        if stored is not None and os.path.isfile(stored):
+            _copy_atomic(stored, variant)
+            self.count("reused")
+            return
+        compressed = compress_data(data, fmt)
+        _write_atomic(variant, compressed)
+        if stored is not None:
+            os.makedirs(self.store_dir, exist_ok=True)
+            _write_atomic(stored, compressed)
+        with self.lock:
+            self.stats["compressed"] += 1
+            self.stats["bytes_in"] += len(data)
+            self.stats["bytes_out"] += len(compressed)
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def forget(self, path):
+        remove_variants(path)
+        with self.lock:
+            self.state.pop(os.path.abspath(path), None)
+
+    def wait(self):
+        # Returns [(path, error message)] for files that could not be compressed
+        futures, self.futures = self.futures, []
+        return self.errors_of(futures)
+
+    def take_finished(self):
+        # Like wait, but only for the files already done; a --watch session calls it on every poll
+        # so its futures don't pile up and failures are reported as they happen
+        finished = []
+        pending = []
+        for path, future in self.futures:
+            (finished if future.done() else pending).append((path, future))
+        self.futures = pending
+        return self.errors_of(finished)
+
+    @staticmethod
+    def errors_of(futures):
+        errors = []
+        for path, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append((path, f"{type(e).__name__}: {e}"))
+        return errors
+
+    def close(self):
+        errors = self.wait()
+        self.pool.shutdown()
+        self.state = {key: entry for key, entry in self.state.items() if os.path.isfile(key)}
+        if self.state_path is not None:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.state, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.state_path)
+        if self.store_dir is not None and os.path.isdir(self.store_dir):
+            # Keep only the variants of content some output still has
+            live = {entry["hash"] for entry in self.state.values()}
+            for name in os.listdir(self.store_dir):
+                if name.split(".", 1)[0] not in live:
+                    os.remove(os.path.join(self.store_dir, name))
+        return errors
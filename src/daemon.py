@@ -0,0 +1,282 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+
+import main as cli
+from functions import set_block_cache, set_discovery_cache, set_text_collector, set_precompressor, get_asset_table, set_asset_table, get_image_table, set_image_table, set_content_shard
+from render_cache import BlockCache
+
+
+DEFAULT_SOCKET_PATH = os.path.join(".build_cache", "daemon.sock")
+# Builds that never finish have no place in a request/response daemon
+LONG_RUNNING_FLAGS = ("--watch", "--serve")
+
+
+class DiscoveryCache():
+    # Keeps the discover_content listing of every (content dir, destination, template, filters) it
+    # has walked. A directory's mtime changes whenever an entry is added, removed or renamed in it,
+    # so the listing is reused for as long as every directory it came from has the same mtime.
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, walk):
+        cached = self.entries.get(key)
+        if cached is not None and self.is_current(cached[0]):
+            self.hits += 1
+            return cached[1]
+        directories = {}
+        items = list(walk(directories))
+        self.entries[key] = (directories, items)
+        self.misses += 1
+        return items
+
+    @staticmethod
+    def is_current(directories):
+        for directory, mtime in directories.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+def module_versions():
+    # The daemon runs the code it started with; an edit to any of it means a restart
+    directory = os.path.dirname(os.path.abspath(__file__))
+    versions = {}
+    for name in os.listdir(directory):
+        if name.endswith(".py"):
+            info = os.stat(os.path.join(directory, name))
+            versions[name] = (info.st_mtime_ns, info.st_size)
+    return versions
+
+
+class _LineWriter():
+    # A file-like object that forwards everything written to it to the client as {stream: text} lines
+    def __init__(self, wfile, stream):
+        self.wfile = wfile
+        self.stream = stream
+
+    def write(self, text):
+        if text:
+            self.wfile.write((json.dumps({self.stream: text}) + "\n").encode("utf-8"))
+        return len(text)
+
+    def flush(self):
+        self.wfile.flush()
+
+
+class BuildDaemon():
+    # Runs main.py builds for one site root in a process that stays up between them, so imports,
+    # compiled templates, the content listing and rendered blocks carry over from build to build.
+    # Requests are served one at a time; builds share docs/ and .build_cache/, so they can't overlap.
+    def __init__(self, root, block_cache_entries=4096):
+        self.root = os.path.abspath(root)
+        self.discovery = DiscoveryCache()
+        self.blocks = BlockCache(block_cache_entries)
+        self.versions = module_versions()
+        self.builds = 0
+
+    def check_request(self, request):
+        if os.path.abspath(request.get("cwd", "")) != self.root:
+            return f"Error: this daemon builds {self.root}, not {request.get('cwd')}"
+        argv = request.get("argv", [])
+        if not isinstance(argv, list) or not all(isinstance(arg, str) for arg in argv):
+            return "Error: argv must be a list of strings"
+        # Decided on the parsed arguments, since argparse also accepts "--wat" for --watch; argv
+        # that doesn't parse is left for the build to report
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                args = cli.parse_args(argv)
+        except SystemExit:
+            args = None
+        if args is not None and (args.watch or args.serve):
+            return f"Error: {' and '.join(LONG_RUNNING_FLAGS)} are not available through the daemon"
+        if module_versions() != self.versions:
+            return "Error: the build code changed since the daemon started, restart it"
+        return None
+
+    def reset(self):
+        # Leave nothing from the previous build's flags behind, so each build sees what a cold run would
+        set_text_collector(None)
+        set_precompressor(None)
+        if get_asset_table() is not None:
+            set_asset_table(None)
+        if get_image_table() is not None:
+            set_image_table(None)
+        set_content_shard(None)
+        set_block_cache(self.blocks)
+        set_discovery_cache(self.discovery)
+
+    def build(self, argv, out, err):
+        self.reset()
+        try:
+            with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+                try:
+                    status = cli.main(argv)
+                except SystemExit as e:
+                    # argparse errors and --help
+                    status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                except Exception as e:
+                    print(f"Error: {type(e).__name__}: {e}", file=sys.stderr)
+                    status = 1
+        finally:
+            self.reset()
+        self.builds += 1
+        return status
+
+    def status(self):
+        return {
+            "root": self.root,
+            "pid": os.getpid(),
+            "builds": self.builds,
+            "discovery_hits": self.discovery.hits,
+            "discovery_misses": self.discovery.misses,
+            "cached_blocks": len(self.blocks.entries),
+        }
+
+
+def make_handler(daemon):
+    class DaemonRequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            try:
+                request = json.loads(self.rfile.readline())
+            except ValueError:
+                self.reply({"err": "Error: malformed request\n"}, {"status": 2})
+                return
+            command = request.get("command", "build")
+            if command == "status":
+                self.reply(dict(daemon.status(), status=0))
+            elif command == "stop":
+                self.reply({"status": 0})
+                # shutdown() waits for serve_forever, which is waiting for this handler to return
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            elif command == "build":
+                error = daemon.check_request(request)
+                if error is not None:
+                    self.reply({"err": error + "\n"}, {"status": 2})
+                    return
+                status = daemon.build(request["argv"], _LineWriter(self.wfile, "out"), _LineWriter(self.wfile, "err"))
+                self.reply({"status": status})
+            else:
+                self.reply({"err": f"Error: unknown command '{command}'\n"}, {"status": 2})
+
+        def reply(self, *messages):
+            for message in messages:
+                self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+
+    return DaemonRequestHandler
+
+
+def is_listening(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def start_daemon(daemon, socket_path=DEFAULT_SOCKET_PATH):
+    if os.path.exists(socket_path):
+        if is_listening(socket_path):
+            raise ValueError(f"Error: a daemon is already listening on {socket_path}")
+        # Left behind by a daemon that did not shut down cleanly
+        os.remove(socket_path)
+    directory = os.path.dirname(socket_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return socketserver.UnixStreamServer(socket_path, make_handler(daemon))
+
+
+def run_daemon(daemon, socket_path=DEFAULT_SOCKET_PATH):
+    server = start_daemon(daemon, socket_path)
+    print(f"Build daemon for {daemon.root} listening on {socket_path} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    return 0
+
+
+def send_request(request, socket_path=DEFAULT_SOCKET_PATH, out=None, err=None):
+    # Sends one request and copies the build's output to out/err as it arrives; returns the final message
+    out = out or sys.stdout
+    err = err or sys.stderr
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(socket_path)
+        except OSError:
+            raise ValueError(f"Error: no build daemon is listening on {socket_path} (start one with 'python3 src/daemon.py start')")
+        s.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with s.makefile("rb") as f:
+            for line in f:
+                message = json.loads(line)
+                if "out" in message:
+                    out.write(message["out"])
+                elif "err" in message:
+                    err.write(message["err"])
+                else:
+                    return message
+    raise ValueError("Error: the build daemon closed the connection before the build finished")
+
+
+def split_build_argv(argv):
+    # Everything after "build" belongs to main.py, options included, so argparse never sees it
+    index = 0
+    while index < len(argv):
+        if argv[index] == "build":
+            forwarded = argv[index + 1:]
+            if forwarded[:1] == ["--"]:
+                forwarded = forwarded[1:]
+            return argv[:index + 1], forwarded
+        # Skip the value of --socket, which could itself be called "build"
+        index += 2 if argv[index] == "--socket" else 1
+    return argv, []
+
+
+def parse_args(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    argv, forwarded = split_build_argv(argv)
+    parser = argparse.ArgumentParser(description="Keep a build process warm and send it builds over a Unix socket.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unix socket the daemon listens on")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("start", help="run the daemon in the foreground for the site in the current directory")
+    commands.add_parser("build", help="build through the daemon; every argument after it is passed on to main.py")
+    commands.add_parser("status", help="print what the daemon has cached")
+    commands.add_parser("stop", help="stop the daemon")
+    args = parser.parse_args(argv)
+    args.argv = forwarded
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "start":
+        return run_daemon(BuildDaemon(os.getcwd()), args.socket)
+    request = {"command": args.command}
+    if args.command == "build":
+        request.update(argv=args.argv, cwd=os.getcwd())
+    reply = send_request(request, args.socket)
+    if args.command == "status":
+        for key, value in reply.items():
+            if key != "status":
+                print(f"{key}: {value}")
+    return reply["status"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
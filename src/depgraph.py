@@ -0,0 +1,151 @@
+import json
+import os
+import posixpath
+
+from urllib.parse import urlsplit
+from functions import extract_markdown_images, extract_markdown_links
+
+
+DEPGRAPH_VERSION = 1
+
+
+def _relative_files(root):
+    files = set()
+    if not root or not os.path.isdir(root):
+        return files
+    for directory, _, names in os.walk(root):
+        for name in names:
+            files.add(os.path.relpath(os.path.join(directory, name), root).replace(os.sep, "/"))
+    return files
+
+
+class UrlResolver():
+    # Maps the URLs written in a page's Markdown onto the files that produce them:
+    # "content:<path>" for sources under content/, "static:<path>" for static assets,
+    # None for internal URLs nothing produces (broken), and external URLs are skipped entirely.
+    def __init__(self, content_dir, static_dir=None, content_files=None, static_files=None):
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.content_files = _relative_files(content_dir) if content_files is None else content_files
+        self.static_files = _relative_files(static_dir) if static_files is None else static_files
+
+    def is_internal(self, url):
+        parts = urlsplit(url)
+        return not (parts.scheme or parts.netloc or url.startswith("#"))
+
+    def resolve(self, url, page_source):
+        path = urlsplit(url).path
+        if path.startswith("/"):
+            relative = posixpath.normpath(path.lstrip("/") or ".")
+        else:
+            page_dir = os.path.relpath(os.path.dirname(page_source), self.content_dir).replace(os.sep, "/")
+            relative = posixpath.normpath(posixpath.join(page_dir, path))
+        relative = "" if relative == "." else relative
+
+        candidates = []
+        if relative.endswith(".html"):
+            candidates.append(relative.removesuffix(".html") + ".md")
+        candidates.append(relative)
+        candidates.append(relative + ".md")
+        candidates.append(posixpath.join(relative, "index.md"))
+        for candidate in candidates:
+            if candidate in self.content_files:
+                return "content:" + candidate
+        if relative in self.static_files:
+            return "static:" + relative
+        return None
+
+    def target_path(self, target):
+        kind, relative = target.split(":", 1)
+        root = self.content_dir if kind == "content" else self.static_dir
+        return os.path.join(root, *relative.split("/"))
+
+    def signature(self, target):
+        if target is None:
+            return None
+        try:
+            info = os.stat(self.target_path(target))
+        except OSError:
+            return None
+        return [info.st_size, info.st_mtime_ns]
+
+
+def page_dependencies(source, resolver):
+    with open(source, "r") as f:
+        markdown = f.read()
+    images = []
+    for _, url in extract_markdown_images(markdown):
+        if resolver.is_internal(url):
+            target = resolver.resolve(url, source)
+            images.append([url, target, resolver.signature(target)])
+    links = []
+    for _, url in extract_markdown_links(markdown):
+        if resolver.is_internal(url):
+            links.append([url, resolver.resolve(url, source)])
+    return images, links
+
+
+class DependencyGraph():
+    def __init__(self):
+        # source -> {"output", "template", "images": [[url, target, signature]], "links": [[url, target]]}
+        self.pages = {}
+
+    @classmethod
+    def load(cls, path):
+        graph = cls()
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return graph
+        if isinstance(data, dict) and data.get("version") == DEPGRAPH_VERSION:
+            graph.pages = data["pages"]
+        return graph
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": DEPGRAPH_VERSION, "pages": self.pages}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def record_page(self, source, output, template, resolver):
+        images, links = page_dependencies(source, resolver)
+        self.pages[source] = {"output": output, "template": template, "images": images, "links": links}
+
+    def remove_page(self, source):
+        self.pages.pop(source, None)
+
+    def is_stale(self, source, resolver):
+        # True when something this page points at now resolves differently or an image file changed
+        node = self.pages.get(source)
+        if node is None:
+            return True
+        for url, target, signature in node["images"]:
+            current = resolver.resolve(url, source)
+            if current != target or resolver.signature(current) != signature:
+                return True
+        for url, target in node["links"]:
+            if resolver.resolve(url, source) != target:
+                return True
+        return False
+
+    def broken_links(self):
+        broken = []
+        for source, node in sorted(self.pages.items()):
+            for url, target, _ in node["images"]:
+                if target is None:
+                    broken.append((source, url))
+            for url, target in node["links"]:
+                if target is None:
+                    broken.append((source, url))
+        return broken
+
+
+def build_dependency_graph(pages, resolver):
+    graph = DependencyGraph()
+    for source, output, template in pages:
+        graph.record_page(source, output, template, resolver)
+    return graph
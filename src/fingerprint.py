@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+
+from functions import get_precompressor
+from incremental import hash_file
+
+
+DEFAULT_FINGERPRINT_STATE_PATH = os.path.join(".build_cache", "fingerprints.json")
+HASH_LENGTH = 10
+
+
+def fingerprinted_name(relative, digest):
+    # "images/tom.png" -> "images/tom.<hash>.png"
+    directory, name = os.path.split(relative)
+    stem, extension = os.path.splitext(name)
+    return os.path.join(directory, f"{stem}.{digest[:HASH_LENGTH]}{extension}").replace(os.sep, "/")
+
+
+def load_fingerprint_state(state_path):
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}, "outputs": []}
+    if not isinstance(state, dict) or "files" not in state:
+        return {"files": {}, "outputs": []}
+    return state
+
+
+def save_fingerprint_state(state_path, state):
+    directory = os.path.dirname(state_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+
+def build_asset_table(static_dir, state):
+    # Returns ({"index.css": "index.<hash>.css", ...}, stats); a file whose size and mtime match
+    # the cached entry keeps its hash without being read again
+    previous = state["files"]
+    files = {}
+    table = {}
+    stats = {"hashed": 0, "reused": 0}
+    for directory, _, names in os.walk(static_dir):
+        for name in names:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, static_dir).replace(os.sep, "/")
+            info = os.stat(path)
+            entry = previous.get(relative)
+            if entry is not None and entry["size"] == info.st_size and entry["mtime"] == info.st_mtime_ns:
+                stats["reused"] += 1
+            else:
+                entry = {"size": info.st_size, "mtime": info.st_mtime_ns, "hash": hash_file(path)}
+                stats["hashed"] += 1
+            files[relative] = entry
+            table[relative] = fingerprinted_name(relative, entry["hash"])
+    state["files"] = files
+    return table, stats
+
+
+def _place(src, dst):
+    # A copy rather than a hard link: an in-place edit of the source must not change a published hash
+    tmp_path = dst + ".tmp"
+    shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+def publish_fingerprinted(static_dir, dest_dir, table, state):
+    # Writes the fingerprinted copies next to the plain ones (which stay for CSS url() and other
+    # references outside the rendered HTML) and removes fingerprinted files from earlier builds
+    precompressor = get_precompressor()
+    written = 0
+    for relative, fingerprinted in sorted(table.items()):
+        dst = os.path.join(dest_dir, *fingerprinted.split("/"))
+        if os.path.isfile(dst):
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        _place(os.path.join(static_dir, *relative.split("/")), dst)
+        written += 1
+        if precompressor is not None:
+            precompressor.submit(dst)
+    current = set(table.values())
+    removed = 0
+    for fingerprinted in state.get("outputs", []):
+        if fingerprinted in current:
+            continue
+        dst = os.path.join(dest_dir, *fingerprinted.split("/"))
+        if os.path.isfile(dst):
+            os.remove(dst)
+            removed += 1
+        if precompressor is not None:
+            precompressor.forget(dst)
+    state["outputs"] = sorted(current)
+    return {"written": written, "removed": removed}
+
+
+def fingerprint_static(static_dir, dest_dir, state_path=DEFAULT_FINGERPRINT_STATE_PATH):
+    if not os.path.isdir(static_dir):
+        raise ValueError('Error: Invalid source directory - source path is not a directory!')
+    state = load_fingerprint_state(state_path)
+    table, stats = build_asset_table(static_dir, state)
+    stats.update(publish_fingerprinted(static_dir, dest_dir, table, state))
+    save_fingerprint_state(state_path, state)
+    return table, stats
@@ -1,6 +1,10 @@
+import fnmatch
+import io
 import re
 import os
 import shutil
+import stat
+import time
 
 from enum import Enum
 from textnode import TextNode, TextType
@@ -27,15 +31,27 @@ def text_node_to_html_node(text_node):
     elif text_node.text_type == TextType.LINK:
         return LeafNode(tag="a", value=text_node.text, props={"href":text_node.url})
     elif text_node.text_type == TextType.IMAGE:
-        return LeafNode(tag="img", value="", props={"src":text_node.url, "alt":text_node.text})
+        props = {"src":text_node.url, "alt":text_node.text}
+        if _image_table is not None and text_node.url.startswith("/"):
+            props.update(_image_table.get(text_node.url[1:], ()))
+        return LeafNode(tag="img", value="", props=props)
     else:
         raise TypeError("Error: text_node is of invalid TextType!")
     
 
+IMAGE_RE = re.compile(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)")
+LINK_RE = re.compile(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)")
+INLINE_DELIMITER_RE = re.compile(r"\*\*|_|`")
+def has_inline_markup(text):
+    # Text containing none of these characters has no inline markup at all; four substring
+    # searches are much cheaper than a regex scan or a per-character set test
+    return "*" in text or "_" in text or "`" in text or "[" in text
+
+
 def split_nodes_delimiter(old_nodes, delimiter, text_type):
     output = []
     for node in old_nodes:
-        if node.text_type != TextType.TEXT:
+        if node.text_type != TextType.TEXT or delimiter not in node.text:
         #    raise TypeError("Error: Cannot delimit non-text nodes")
             output.append(node)
             continue
@@ -46,132 +62,368 @@ def split_nodes_delimiter(old_nodes, delimiter, text_type):
 
 
 def extract_markdown_images(text):
-    matches = re.findall(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)", text)
-    return [(match[0], match[1]) for match in matches]
+    if "![" not in text:
+        return []
+    return IMAGE_RE.findall(text)
 
 
 def extract_markdown_links(text):
-    matches = re.findall(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)", text)
-    return [(match[0], match[1]) for match in matches]
+    if "](" not in text:
+        return []
+    return LINK_RE.findall(text)
 
 
-def split_nodes_image(old_nodes):
+def _split_nodes_pattern(old_nodes, pattern, marker, text_type):
     output = []
     for node in old_nodes:
         if node.text_type != TextType.TEXT:
-        #    raise TypeError("Error: Cannot delimit non-text nodes")
             output.append(node)
             continue
-        pieces = re.split(r'!\[([^\[\]]*)\]\(([^\(\)]*)\)', node.text)
-        tmp_result = []
+        if marker not in node.text:
+            # Empty text nodes are dropped, as the full split would do
+            if node.text:
+                output.append(node)
+            continue
+        pieces = pattern.split(node.text)
         for i in range(0, len(pieces)-1, 3):
             if pieces[i]:
-                tmp_result.append(TextNode(pieces[i], TextType.TEXT))
-            tmp_result.append(TextNode(pieces[i+1], TextType.IMAGE, pieces[i+2]))
-        if len(pieces) % 3 == 1 and pieces[-1]:
-            tmp_result.append(TextNode(pieces[-1], TextType.TEXT))
-        output.extend(tmp_result)
+                output.append(TextNode(pieces[i], TextType.TEXT))
+            output.append(TextNode(pieces[i+1], text_type, pieces[i+2]))
+        if pieces[-1]:
+            output.append(TextNode(pieces[-1], TextType.TEXT))
     return output
-    
+
+
+def split_nodes_image(old_nodes):
+    return _split_nodes_pattern(old_nodes, IMAGE_RE, "![", TextType.IMAGE)
+
 
 def split_nodes_link(old_nodes):
-    output = []
-    for node in old_nodes:
-        if node.text_type != TextType.TEXT:
-            #raise TypeError("Error: Cannot delimit non-text nodes")
-            output.append(node)
-            continue
-        pieces = re.split(r'(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)', node.text)
-        tmp_result = []
-        for i in range(0, len(pieces)-1, 3):
-            if pieces[i]:
-                tmp_result.append(TextNode(pieces[i], TextType.TEXT))
-            tmp_result.append(TextNode(pieces[i+1], TextType.LINK, pieces[i+2]))
-        if len(pieces) % 3 == 1 and pieces[-1]:
-            tmp_result.append(TextNode(pieces[-1], TextType.TEXT))
-        output.extend(tmp_result)
-    return output
+    return _split_nodes_pattern(old_nodes, LINK_RE, "](", TextType.LINK)
+
+
+def _append_links(output, text):
+    start = 0
+    for match in LINK_RE.finditer(text):
+        if match.start() > start:
+            output.append(TextNode(text[start:match.start()], TextType.TEXT))
+        output.append(TextNode(match.group(1), TextType.LINK, match.group(2)))
+        start = match.end()
+    if start < len(text):
+        output.append(TextNode(text[start:], TextType.TEXT))
+
+
+def _append_plain_text(output, text):
+    # Links are matched on the text between images, exactly like split_nodes_link after split_nodes_image
+    if "](" not in text:
+        if text:
+            output.append(TextNode(text, TextType.TEXT))
+        return
+    start = 0
+    for match in IMAGE_RE.finditer(text):
+        _append_links(output, text[start:match.start()])
+        output.append(TextNode(match.group(1), TextType.IMAGE, match.group(2)))
+        start = match.end()
+    _append_links(output, text[start:])
+
+
+def _append_inline(output, piece, bold, italic, code):
+    if bold:
+        output.append(TextNode(piece, TextType.BOLD))
+    elif italic:
+        output.append(TextNode(piece, TextType.ITALIC))
+    elif code:
+        output.append(TextNode(piece, TextType.CODE))
+    else:
+        _append_plain_text(output, piece)
 
 
 def text_to_textnodes(text):
-    output = [TextNode(text, TextType.TEXT)]
-    output = split_nodes_delimiter(output, "**", TextType.BOLD)
-    output = split_nodes_delimiter(output, "_", TextType.ITALIC)
-    output = split_nodes_delimiter(output, "`", TextType.CODE)
-    output = split_nodes_image(output)
-    output = split_nodes_link(output)
+    # Single scan equivalent of running split_nodes_delimiter for "**", "_" and "`" and then
+    # split_nodes_image and split_nodes_link: "**" always splits, "_" only splits outside bold,
+    # "`" only outside bold and italic, and images/links are only looked for in plain text.
+    if not has_inline_markup(text):
+        return [TextNode(text, TextType.TEXT)] if text else []
+    return _scan_inline(text)
+
+
+def _scan_inline(text):
+    output = []
+    bold = italic = code = False
+    start = 0
+    for match in INLINE_DELIMITER_RE.finditer(text):
+        delimiter = match.group()
+        if (delimiter == "_" and bold) or (delimiter == "`" and (bold or italic)):
+            continue
+        _append_inline(output, text[start:match.start()], bold, italic, code)
+        start = match.end()
+        if delimiter == "**":
+            bold = not bold
+            italic = code = False
+        elif delimiter == "_":
+            italic = not italic
+            code = False
+        else:
+            code = not code
+    _append_inline(output, text[start:], bold, italic, code)
     return output
 
 
 def markdown_to_blocks(markdown):
+    if "```" in markdown:
+        # Fences can hold blank lines, which the plain split would cut apart
+        return list(iter_markdown_blocks(markdown.split("\n")))
     blocks = markdown.split("\n\n")
     return [block.strip() for block in blocks if block.strip() != ""]
 
 
-def block_to_block_type(markdown):
-    if re.match(r'#+ ', markdown[:7]):
+def _opens_fence(line):
+    # "```" or "```lang"; a line like "```code```" is inline code, not a fence
+    stripped = line.strip()
+    return stripped.startswith("```") and "`" not in stripped.lstrip("`")
+
+
+def iter_markdown_blocks(lines):
+    # Yields the blocks of markdown_to_blocks from any iterable of lines (such as an open file),
+    # holding one block at a time. Blocks end at empty lines, except inside a ``` fence, which
+    # runs until a line ending in ```. A fence still open at the end of the input was never a
+    # fence, so what it buffered is split on empty lines like everything else.
+    block = []
+    in_fence = False
+    for line in lines:
+        line = line.rstrip("\n")
+        if in_fence:
+            block.append(line)
+            if line.rstrip().endswith("```"):
+                in_fence = False
+            continue
+        if line == "":
+            text = "\n".join(block).strip()
+            if text:
+                yield text
+            block = []
+            continue
+        block.append(line)
+        in_fence = _opens_fence(line)
+    if in_fence:
+        # No later line ends in ```, so no later fence can close either
+        yield from (piece.strip() for piece in "\n".join(block).split("\n\n") if piece.strip() != "")
+        return
+    text = "\n".join(block).strip()
+    if text:
+        yield text
+
+
+HEADING_RE = re.compile(r'#+ ')
+
+
+def classify_block_lines(block, lines):
+    # One pass over the lines, tracking which of the quote/list shapes still fit;
+    # the checks and their priority are the same as the original per-type scans.
+    if HEADING_RE.match(block[:7]):
         return BlockType.HEADING
-    elif markdown.split("\n")[0].startswith('```') and markdown.split("\n")[-1].endswith('```'):
+    if lines[0].startswith('```') and lines[-1].endswith('```'):
         return BlockType.CODE
-    elif all([piece.startswith('>') for piece in markdown.split("\n")]):
+    quote = unordered = ordered = True
+    for i, line in enumerate(lines):
+        if quote and not line.startswith('>'):
+            quote = False
+        if unordered and not line.startswith('- '):
+            unordered = False
+        if ordered and line.strip():
+            number = line.split(". ", 1)[0]
+            if not (number.isdigit() and int(number) == i + 1):
+                ordered = False
+        if not (quote or unordered or ordered):
+            return BlockType.PARAGRAPH
+    if quote:
         return BlockType.QUOTE
-    elif all([piece.startswith('- ') for piece in markdown.split("\n")]):
+    if unordered:
         return BlockType.UNORDERED_LIST
-    elif all([line.split(". ")[0].isdigit() and int(line.split(". ")[0]) == i+1 for i, line in enumerate(markdown.split("\n")) if line.strip()]):
-        return BlockType.ORDERED_LIST
+    return BlockType.ORDERED_LIST
+
+
+def block_to_block_type(markdown):
+    return classify_block_lines(markdown, markdown.split("\n"))
+
+
+def _ordered_item_text(line):
+    # Drops the "N. " marker; blank lines have no marker and strip to nothing
+    marker = line.find(". ")
+    if marker == -1:
+        return line.strip()
+    return line[marker + 2:].strip()
+
+
+def block_to_html_node(block, block_type=None, lines=None):
+    if lines is None:
+        lines = block.split("\n")
+    if block_type is None:
+        block_type = classify_block_lines(block, lines)
+    if block_type == BlockType.PARAGRAPH:
+        text = " ".join(line.strip() for line in lines if line.strip() != "")
+        return ParentNode("p", text_to_children(text))
+    elif block_type == BlockType.HEADING:
+        marker, _, text = lines[0].partition(" ")
+        return ParentNode(f"h{len(marker)}", text_to_children(text.strip()))
+    elif block_type == BlockType.CODE:
+        inner = "\n".join(lines[1:-1])
+        if block.endswith("\n```"):
+            inner += "\n"
+        code_leaf = LeafNode("code", inner)
+        return ParentNode("pre",[code_leaf])
+    elif block_type == BlockType.QUOTE:
+        text = " ".join(s for s in (line[1:].strip() for line in lines) if s)
+        return ParentNode("blockquote", text_to_children(text))
+    elif block_type == BlockType.UNORDERED_LIST:
+        items = (line[2:].strip() for line in lines)
+        return ParentNode("ul", [ParentNode("li", text_to_children(t)) for t in items if t])
     else:
-        return BlockType.PARAGRAPH
-    
+        items = (_ordered_item_text(line) for line in lines if line.strip())
+        return ParentNode("ol", [ParentNode("li", text_to_children(t)) for t in items if t])
+
 
 def markdown_to_html_node(markdown):
-    blocks = markdown_to_blocks(markdown)
-    children = []
+    return ParentNode("div", [block_to_html_node(block) for block in markdown_to_blocks(markdown)])
+
+
+_block_cache = None
+
+
+def set_block_cache(cache):
+    # Installs a render_cache.BlockCache (or None) for every page rendered in this process
+    global _block_cache
+    previous = _block_cache
+    _block_cache = cache
+    return previous
+
+
+def get_block_cache():
+    return _block_cache
+
+
+_text_collector = None
+
+
+def set_text_collector(collector):
+    # Installs an object that sees the title and inline TextNodes of every page generate_page
+    # renders in this process (see search.SearchCollector); returns the previous one
+    global _text_collector
+    previous = _text_collector
+    _text_collector = collector
+    return previous
+
+
+def get_text_collector():
+    return _text_collector
+
+
+_precompressor = None
+
+
+def set_precompressor(precompressor):
+    # Installs a compress.Precompressor (or None) that gets every page and static file written
+    global _precompressor
+    previous = _precompressor
+    _precompressor = precompressor
+    return previous
+
+
+def get_precompressor():
+    return _precompressor
+
+
+def block_to_html(block):
+    # A cached block never reaches text_to_children, so the cache is bypassed while collecting text.
+    # Image markup depends on the image table too; leaving those blocks out of the cache while a
+    # table is installed keeps every cached fragment valid for builds without one.
+    if _block_cache is None or _text_collector is not None or (_image_table is not None and "![" in block):
+        return block_to_html_node(block).to_html()
+    lines = block.split("\n")
+    block_type = classify_block_lines(block, lines)
+    key = (block_type.value, block)
+    html = _block_cache.get(key)
+    if html is None:
+        html = block_to_html_node(block, block_type, lines).to_html()
+        _block_cache.put(key, html)
+    return html
+
+
+def iter_content_html(blocks):
+    # Same markup as markdown_to_html_node(...).to_html(), one block at a time
+    yield "<div>"
+    for block in blocks:
+        yield block_to_html(block)
+    yield "</div>"
+
+
+CONTENT_STAGES = ("classify", "inline", "to_html")
+
+
+def new_page_profile():
+    return {"stages": {}, "nodes": 0, "bytes": 0, "total": 0.0}
+
+
+def _add_time(profile, stage, seconds):
+    profile["stages"][stage] = profile["stages"].get(stage, 0.0) + seconds
+
+
+def _count_nodes(node):
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if node.children:
+            stack.extend(node.children)
+    return count
+
+
+def iter_content_html_profiled(blocks, profile):
+    # iter_content_html with the work split into timed stages; "inline" covers text_to_textnodes
+    # and building the block's node tree
+    yield "<div>"
     for block in blocks:
-        block_type = block_to_block_type(block)
-        if block_type == BlockType.PARAGRAPH:
-            lines = block.split("\n")
-            text = " ".join(line.strip() for line in lines if line.strip() != "")
-            p_children = text_to_children(text)
-            children.append(ParentNode("p",p_children))
-        elif block_type == BlockType.HEADING:
-            line = block.split("\n", 1)[0]
-            pieces = line.split(" ")
-            level = len(pieces[0])
-            text = " ".join(pieces[1:]).strip()
-            p_children = text_to_children(text)
-            children.append(ParentNode(f"h{level}",p_children))
-        elif block_type == BlockType.CODE:
-            lines = block.split("\n")
-            inner = "\n".join(lines[1:-1])
-            if block.endswith("\n```"):
-                inner += "\n"
-            code_leaf = LeafNode("code", inner)
-            children.append(ParentNode("pre",[code_leaf]))
-        elif block_type == BlockType.QUOTE:
-            lines = block.split("\n")
-            stripped = [re.sub(r"^>\s?", "", l) for l in lines]
-            text = " ".join(s.strip() for s in stripped if s.strip())
-            children.append(ParentNode("blockquote", text_to_children(text)))
-        elif block_type == BlockType.UNORDERED_LIST:
-            items =  [re.sub(r"^-\s", "", l, count=1).strip() for l in block.split("\n")]
-            list_nodes = [ParentNode("li", text_to_children(t)) for t in items if t]
-            children.append(ParentNode("ul",list_nodes))
-        elif block_type == BlockType.ORDERED_LIST:
-            items = [re.sub(r"^\d+\.\s", "", l, count=1).strip() for l in block.split("\n")]
-            list_nodes = [ParentNode("li", text_to_children(t)) for t in items if t]
-            children.append(ParentNode("ol", list_nodes))
-    return ParentNode("div", children)
+        started = time.perf_counter()
+        lines = block.split("\n")
+        block_type = classify_block_lines(block, lines)
+        classified = time.perf_counter()
+        node = block_to_html_node(block, block_type, lines)
+        built = time.perf_counter()
+        html = node.to_html()
+        serialized = time.perf_counter()
+        _add_time(profile, "classify", classified - started)
+        _add_time(profile, "inline", built - classified)
+        _add_time(profile, "to_html", serialized - built)
+        profile["nodes"] += _count_nodes(node)
+        yield html
+    yield "</div>"
+
+
+class _TimedWriter():
+    def __init__(self, out, profile):
+        self.out = out
+        self.profile = profile
+
+    def write(self, text):
+        started = time.perf_counter()
+        self.out.write(text)
+        _add_time(self.profile, "write", time.perf_counter() - started)
 
 
 def text_to_children(text):
     if text.strip() == "":
         return []
+    if _text_collector is None and not has_inline_markup(text):
+        return [LeafNode(value=text)]
     try:
         text_nodes = text_to_textnodes(text)
         children = [text_node_to_html_node(node) for node in text_nodes if node.text != ""]
-        return children
     except Exception as e:
         raise ValueError(f"Error - Invalid inline markdown: {e}")
+    if _text_collector is not None:
+        _text_collector.add(text_nodes)
+    return children
     
 
 def publish_static(source="static", destination="docs"):
@@ -180,7 +432,7 @@ def publish_static(source="static", destination="docs"):
 
     if not os.path.isdir(source_path):
         raise ValueError('Error: Invalid source directory - source path is not a directory!')
-    
+
     if os.path.exists(destination_path):
         shutil.rmtree(destination_path)
 
@@ -192,6 +444,8 @@ def publish_static(source="static", destination="docs"):
             dst_child = os.path.join(dst, item)
             if os.path.isfile(src_child):
                 shutil.copy(src_child, dst_child)
+                if _precompressor is not None:
+                    _precompressor.submit(dst_child)
             elif os.path.isdir(src_child):
                 os.makedirs(dst_child, exist_ok=True)
                 copy_dir(src_child, dst_child)
@@ -199,46 +453,326 @@ def publish_static(source="static", destination="docs"):
 
 
 def extract_title(markdown):
-    title_lines = [line for line in markdown.split("\n") if line.startswith('# ')]
-    if len(title_lines) < 1:
-        raise Exception("Error: no title detected!")
-    else:
-        return title_lines[0][2:].strip()
+    return extract_title_from_lines(markdown.split("\n"))
 
 
-def generate_page(from_path, template_path, dest_path, basepath):
-    if not os.path.exists(from_path):
-        raise ValueError(f"Error: from_path '{from_path}' does not exist!")
-    if not os.path.exists(template_path):
-        raise ValueError(f"Error: template_path '{template_path}' does not exist!")
-    if not os.path.isfile(from_path):
-        raise ValueError(f"Error: {from_path} does not point to a valid file!")
-    if not os.path.isfile(template_path):
-        raise ValueError(f"Error: {template_path} does not point to a valid file!")
-    
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
+def extract_title_from_lines(lines):
+    # Stops at the first "# " line, so a file object is only read up to the title
+    for line in lines:
+        if line.startswith('# '):
+            return line[2:].strip()
+    raise Exception("Error: no title detected!")
+
+
+TEMPLATE_SLOT_RE = re.compile(r"\{\{ (Title|Content) \}\}")
+
+
+def split_template(template_content):
+    # Static text at even indices, slot names ("Title"/"Content") at odd indices
+    return TEMPLATE_SLOT_RE.split(template_content)
+
+
+ASSET_REFERENCE_RE = re.compile(r'(href|src)="/([^"?#]*)')
+_asset_table = None
+
+
+def set_asset_table(table):
+    # Installs a fingerprint table ("index.css" -> "index.<hash>.css", see fingerprint.py) that
+    # rewrite_basepath applies to root-relative references; returns the previous one
+    global _asset_table
+    previous = _asset_table
+    _asset_table = table
+    # Compiled templates have the old references baked into their static parts
+    _template_cache.clear()
+    return previous
+
 
-    with open(from_path, "r") as f:
-        file_content = f.read()
+def get_asset_table():
+    return _asset_table
+
+
+_image_table = None
+
+
+def set_image_table(table):
+    # Installs the table from images.py ("images/tom.png" -> {"width": ..., "height": ..., "srcset": ...})
+    # whose props text_node_to_html_node adds to root-relative images; returns the previous one
+    global _image_table
+    previous = _image_table
+    _image_table = table
+    _template_cache.clear()
+    return previous
+
+
+def get_image_table():
+    return _image_table
+
+
+def _rewrite_reference(match, basepath):
+    path = match.group(2)
+    return f'{match.group(1)}="{basepath}{_asset_table.get(path, path)}'
+
+
+SRCSET_RE = re.compile(r'srcset="([^"]*)"')
+
+
+def _rewrite_srcset(match, basepath):
+    candidates = []
+    for candidate in match.group(1).split(", "):
+        if candidate.startswith("/"):
+            path, _, descriptor = candidate[1:].partition(" ")
+            if _asset_table is not None:
+                path = _asset_table.get(path, path)
+            candidate = f"{basepath}{path} {descriptor}"
+        candidates.append(candidate)
+    return f'srcset="{", ".join(candidates)}"'
+
+
+def rewrite_basepath(html, basepath):
+    if _image_table is not None and 'srcset="' in html:
+        # Every candidate in a srcset is a URL of its own, not just the first
+        html = SRCSET_RE.sub(lambda match: _rewrite_srcset(match, basepath), html)
+    if _asset_table is None:
+        return html.replace('href="/', f'href="{basepath}').replace('src="/', f'src="{basepath}')
+    # One pass does both the basepath prefix and the fingerprinted name lookup
+    return ASSET_REFERENCE_RE.sub(lambda match: _rewrite_reference(match, basepath), html)
+
+
+class CompiledTemplate():
+    def __init__(self, template_content, basepath):
+        segments = split_template(template_content)
+        self.basepath = basepath
+        # The basepath rewrite is applied to the static parts once, not once per page
+        self.static = [rewrite_basepath(segment, basepath) for segment in segments[0::2]]
+        self.slots = segments[1::2]
+
+    def render(self, out, title, blocks, content_html=iter_content_html):
+        title = rewrite_basepath(title, self.basepath)
+        out.write(self.static[0])
+        for slot, static in zip(self.slots, self.static[1:]):
+            if slot == "Title":
+                out.write(title)
+            else:
+                for chunk in content_html(blocks):
+                    out.write(rewrite_basepath(chunk, self.basepath))
+            out.write(static)
 
+    def render_to_string(self, title, blocks):
+        out = io.StringIO()
+        self.render(out, title, blocks)
+        return out.getvalue()
+
+
+TEMPLATE_NAME = "template.html"
+_template_cache = {}
+
+
+def load_template(template_path, basepath):
+    # Compiled once per (template, basepath); the stat check picks up edits in long-running processes
+    info = os.stat(template_path)
+    version = (info.st_mtime_ns, info.st_size)
+    key = (os.path.abspath(template_path), basepath)
+    cached = _template_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
     with open(template_path, "r") as t:
-        template_content = t.read()
-    
-    file_content_html = markdown_to_html_node(file_content).to_html()
-    title = extract_title(file_content)
+        template = CompiledTemplate(t.read(), basepath)
+    _template_cache[key] = (version, template)
+    return template
+
+
+PAGE_SUFFIX = ".md"
+
+
+def is_page_source(name):
+    return name.endswith(PAGE_SUFFIX)
+
+
+def page_output_name(name):
+    return name.removesuffix(PAGE_SUFFIX) + ".html"
+
+
+def _matches_any(relative, patterns):
+    return any(fnmatch.fnmatchcase(relative, pattern) or fnmatch.fnmatchcase(os.path.basename(relative), pattern) for pattern in patterns)
+
+
+def is_content_included(relative, include=None, exclude=None):
+    # relative is "/"-separated from the content root; excluding a directory excludes everything under it
+    if exclude:
+        parts = relative.split("/")
+        for depth in range(1, len(parts) + 1):
+            if _matches_any("/".join(parts[:depth]), exclude):
+                return False
+    return not include or _matches_any(relative, include)
+
+
+_discovery_cache = None
+
 
-    template_content = template_content.replace('{{ Title }}', title)
-    template_content = template_content.replace('{{ Content }}', file_content_html)
-    template_content = template_content.replace('href="/', f'href="{basepath}')
-    template_content = template_content.replace('src="/', f'src="{basepath}')
+def set_discovery_cache(cache):
+    # Installs an object that keeps discover_content results between builds of a long-running
+    # process (see daemon.DiscoveryCache); returns the previous one
+    global _discovery_cache
+    previous = _discovery_cache
+    _discovery_cache = cache
+    return previous
 
-    if not os.path.exists(os.path.dirname(dest_path)):
-        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
 
-    with open(dest_path, "w") as d:
-        d.write(template_content)
+_content_shard = None
 
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath):
+
+def set_content_shard(shard):
+    # Installs an object whose select(items, content_dir) keeps only this process's share of what
+    # discover_content finds (see shard.ContentShard); returns the previous one
+    global _content_shard
+    previous = _content_shard
+    _content_shard = shard
+    return previous
+
+
+def discover_content(dir_path_content, dest_dir_path, template_path, include=None, exclude=None):
+    # Lazily yields ("page", source, destination, template) and ("copy", source, destination, None)
+    # in sorted order. Built on os.scandir so file/directory checks reuse the DirEntry type info
+    # instead of stat-ing every entry, and directory templates are spotted from the listing itself.
+    def walk(src_dir, dst_dir, relative_dir, template, directories=None):
+        if directories is not None:
+            # Stat before listing, so a change made during the walk still shows up next time
+            directories[src_dir] = os.stat(src_dir).st_mtime_ns
+        with os.scandir(src_dir) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        if any(entry.name == TEMPLATE_NAME and entry.is_file() for entry in entries):
+            template = os.path.join(src_dir, TEMPLATE_NAME)
+        subdirectories = []
+        for entry in entries:
+            relative = relative_dir + entry.name
+            if entry.is_dir():
+                if not (exclude and _matches_any(relative, exclude)):
+                    subdirectories.append((entry, relative))
+                continue
+            if entry.name == TEMPLATE_NAME or not entry.is_file():
+                continue
+            if exclude and _matches_any(relative, exclude):
+                continue
+            if include and not _matches_any(relative, include):
+                continue
+            if is_page_source(entry.name):
+                yield "page", entry.path, os.path.join(dst_dir, page_output_name(entry.name)), template
+            else:
+                yield "copy", entry.path, os.path.join(dst_dir, entry.name), None
+        for entry, relative in subdirectories:
+            yield from walk(entry.path, os.path.join(dst_dir, entry.name), relative + "/", template, directories)
+
+    if _discovery_cache is not None:
+        key = (dir_path_content, dest_dir_path, template_path, tuple(include or ()), tuple(exclude or ()))
+        items = _discovery_cache.lookup(key, lambda directories: walk(dir_path_content, dest_dir_path, "", template_path, directories))
+    else:
+        items = walk(dir_path_content, dest_dir_path, "", template_path)
+    if _content_shard is not None:
+        # Splitting by size needs the whole listing up front
+        items = _content_shard.select(list(items), dir_path_content)
+    return iter(items)
+
+
+def directory_template(dir_path, inherited_template_path):
+    # A template.html inside a content directory overrides the template for that whole subtree
+    candidate = os.path.join(dir_path, TEMPLATE_NAME)
+    if os.path.isfile(candidate):
+        return candidate
+    return inherited_template_path
+
+
+def page_template(dir_path_content, template_path, page_path):
+    # Same resolution as the build walk: the closest template.html between the content root and the page
+    relative = os.path.relpath(os.path.dirname(page_path), dir_path_content)
+    directory = dir_path_content
+    template = directory_template(directory, template_path)
+    if relative != ".":
+        for part in relative.split(os.sep):
+            directory = os.path.join(directory, part)
+            template = directory_template(directory, template)
+    return template
+
+
+def _lap(profile, stage, since):
+    now = time.perf_counter()
+    if profile is not None:
+        _add_time(profile, stage, now - since)
+    return now
+
+
+def _check_file(path, name):
+    # One stat per path, with the same errors as separate exists/isfile checks
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        raise ValueError(f"Error: {name} '{path}' does not exist!")
+    if not stat.S_ISREG(mode):
+        raise ValueError(f"Error: {path} does not point to a valid file!")
+
+
+def render_page(markdown, template_path, basepath):
+    # The CPU half of generate_page, for callers that do their own file I/O
+    template = load_template(template_path, basepath)
+    return template.render_to_string(extract_title(markdown), markdown_to_blocks(markdown))
+
+
+def generate_page(from_path, template_path, dest_path, basepath, profile=None):
+    _check_file(from_path, "from_path")
+    _check_file(template_path, "template_path")
+    
+    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
+    started = lap = time.perf_counter()
+
+    # The source is read twice, line by line: once up to the title, then block by block while
+    # rendering, so memory follows the largest block rather than the size of the file
+    source = open(from_path, "r")
+    tmp_path = dest_path + ".tmp"
+    try:
+        template = load_template(template_path, basepath)
+        lap = _lap(profile, "template", lap)
+        title = extract_title_from_lines(source)
+        source.seek(0)
+        lap = _lap(profile, "read", lap)
+        blocks = iter_markdown_blocks(source)
+        if profile is not None or template.slots.count("Content") > 1:
+            # Profiling times the split on its own, and a template showing the content twice needs it twice
+            blocks = list(blocks)
+        lap = _lap(profile, "blocks", lap)
+        if _text_collector is not None:
+            _text_collector.start_page(from_path, dest_path, title)
+
+        if not os.path.exists(os.path.dirname(dest_path)):
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+
+        # Stream into a temporary file so a failure halfway through never leaves a truncated page behind
+        with open(tmp_path, "w") as d:
+            if profile is None:
+                template.render(d, title, blocks)
+            else:
+                # Whatever the content stages and writes don't account for is template substitution
+                inner = ("write",) + CONTENT_STAGES
+                inner_before = sum(profile["stages"].get(stage, 0.0) for stage in inner)
+                template.render(_TimedWriter(d, profile), title, blocks, lambda blocks: iter_content_html_profiled(blocks, profile))
+                inner_spent = sum(profile["stages"].get(stage, 0.0) for stage in inner) - inner_before
+                _add_time(profile, "template", time.perf_counter() - lap - inner_spent)
+                lap = time.perf_counter()
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        source.close()
+    if _text_collector is not None:
+        _text_collector.end_page()
+    if _precompressor is not None:
+        _precompressor.submit(dest_path)
+    if profile is not None:
+        _lap(profile, "write", lap)
+        profile["bytes"] += os.path.getsize(dest_path)
+        profile["total"] += time.perf_counter() - started
+
+def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath, include=None, exclude=None):
     if not os.path.exists(dir_path_content):
         raise ValueError(f"Error: dir_path_content '{dir_path_content}' does not exist!")
     if not os.path.exists(template_path):
@@ -251,17 +785,15 @@ def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, bas
     if not os.path.exists(os.path.abspath(dest_dir_path)):
         os.makedirs(os.path.abspath(dest_dir_path), exist_ok=True)
 
-    for item in os.listdir(dir_path_content):
-        src_child = os.path.join(dir_path_content, item)
-        dst_child = os.path.join(dest_dir_path, item)
-        if os.path.isfile(src_child):
-            if '.md' in item:
-                new_item = item.removesuffix('.md')
-                new_item += '.html'
-                dst_child = os.path.join(dest_dir_path, new_item)
-                generate_page(src_child, template_path, dst_child, basepath)
-            else:
-                shutil.copy(src_child, dst_child)
+    made_dirs = set()
+    for kind, src, dst, template in discover_content(dir_path_content, dest_dir_path, template_path, include, exclude):
+        dst_dir = os.path.dirname(dst)
+        if dst_dir not in made_dirs:
+            os.makedirs(dst_dir, exist_ok=True)
+            made_dirs.add(dst_dir)
+        if kind == "page":
+            generate_page(src, template, dst, basepath)
         else:
-            os.makedirs(dst_child, exist_ok=True)
-            generate_pages_recursive(src_child, template_path, dst_child, basepath)
\ No newline at end of file
+            shutil.copy(src, dst)
+            if _precompressor is not None:
+                _precompressor.submit(dst)
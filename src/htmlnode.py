@@ -1,4 +1,6 @@
 class HTMLNode():
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag
         self.value = value
@@ -6,52 +8,65 @@ class HTMLNode():
         self.props = props
 
     def to_html(self):
+        parts = []
+        self.serialize(parts.append)
+        return "".join(parts)
+
+    def write_html(self, out):
+        self.serialize(out.write)
+
+    def serialize(self, write):
+        # Explicit stack instead of recursion so deep trees can't hit the recursion limit;
+        # closing tags are pushed as plain strings between the node objects.
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                write(item)
+            else:
+                item._emit(write, stack)
+
+    def _emit(self, write, stack):
         raise NotImplementedError
-    
+
     def props_to_html(self):
         if self.props is None:
             return ""
-        out_string = ""
-        for key, value in self.props.items():
-            out_string += f' {key}="{value}"'
-        return out_string
-    
+        return "".join(f' {key}="{value}"' for key, value in self.props.items())
+
     def __repr__(self):
         return f"Tag={self.tag}\nValue={self.value}\nChildren={self.children}\nProps={self.props}"
-    
+
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag=None, value=None, props=None):
         super().__init__(tag, value, props=props)
 
-    def to_html(self):
+    def _emit(self, write, stack):
         if self.value is None:
             raise ValueError("Error: Leaf nodes must have a value!")
         if self.tag is None:
-            return self.value
+            write(self.value)
+        elif self.props is None:
+            write(f"<{self.tag}>{self.value}</{self.tag}>")
         else:
-            out_string = ""
-            out_string += f"<{self.tag}"
-            if self.props is not None:
-                out_string += self.props_to_html()
-            out_string += f">{self.value}</{self.tag}>"
-            return out_string
-        
+            write(f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>")
+
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
         super().__init__(tag, children=children, props=props)
 
-    def to_html(self):
+    def _emit(self, write, stack):
         if self.tag is None:
             raise ValueError("Error: Parent nodes must have a tag!")
         if self.children is None:
             raise ValueError("Error: Parent nodes must have children!")
+        if self.props is None:
+            write(f"<{self.tag}>")
         else:
-            out_string = ""
-            out_string += f"<{self.tag}"
-            if self.props is not None:
-                out_string += self.props_to_html()
-            out_string += ">"
-            for child in self.children:
-                out_string += child.to_html()
-            out_string += f"</{self.tag}>"
-            return out_string
\ No newline at end of file
+            write(f"<{self.tag}{self.props_to_html()}>")
+        stack.append(f"</{self.tag}>")
+        stack.extend(reversed(self.children))
@@ -0,0 +1,184 @@
+import os
+import struct
+
+from concurrent.futures import ProcessPoolExecutor
+from fingerprint import load_fingerprint_state, save_fingerprint_state, _place
+from incremental import hash_file
+from parallel import resolve_workers
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+DEFAULT_IMAGE_STATE_PATH = os.path.join(".build_cache", "images.json")
+DEFAULT_IMAGE_STORE = os.path.join(".build_cache", "images")
+DEFAULT_WIDTHS = (480, 960, 1600)
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+HASH_LENGTH = 10
+JPEG_QUALITY = 82
+
+
+def image_size(path):
+    # (width, height) from the file header, without decoding the image
+    try:
+        size = _header_size(path)
+    except struct.error:
+        # A header cut short
+        size = None
+    if size is None:
+        raise ValueError(f"Error: could not read the size of image '{path}'")
+    return size
+
+
+def _header_size(path):
+    with open(path, "rb") as f:
+        header = f.read(26)
+        if header.startswith(b"\x89PNG\r\n\x1a\n") and header[12:16] == b"IHDR":
+            return struct.unpack(">II", header[16:24])
+        if header.startswith(b"\xff\xd8"):
+            f.seek(2)
+            while True:
+                marker = f.read(4)
+                if len(marker) < 4 or marker[0] != 0xFF:
+                    break
+                kind, length = marker[1], struct.unpack(">H", marker[2:])[0]
+                # Start-of-frame markers; C4, C8 and CC are tables, not frames
+                if 0xC0 <= kind <= 0xCF and kind not in (0xC4, 0xC8, 0xCC):
+                    height, width = struct.unpack(">HH", f.read(5)[1:])
+                    return width, height
+                f.seek(length - 2, os.SEEK_CUR)
+    return None
+
+
+def derivative_widths(width, widths):
+    # Only ever scale down; the original is the largest candidate
+    return sorted(w for w in set(widths) if w < width)
+
+
+def derivative_name(relative, width, digest):
+    # "images/tom.png" -> "images/tom-480w.<hash>.png", so a changed source never reuses a cached URL
+    stem, extension = os.path.splitext(relative)
+    return f"{stem}-{width}w.{digest[:HASH_LENGTH]}{extension}".replace(os.sep, "/")
+
+
+def resize_image(src, dst, width):
+    # Runs in a worker process: scales src to width, keeping the aspect ratio, and recompresses it
+    with Image.open(src) as image:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        fmt = image.format
+    tmp_path = dst + ".tmp"
+    if fmt == "JPEG":
+        resized.convert("RGB").save(tmp_path, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        resized.save(tmp_path, format=fmt, optimize=True)
+    os.replace(tmp_path, dst)
+
+
+def scan_images(static_dir, state):
+    # Returns {relative: {"size", "mtime", "hash", "width", "height"}}; like the fingerprint table,
+    # a file whose size and mtime match the cached entry is not read again. An image whose size
+    # can't be read is reported in stats["errors"] and left out, so its pages keep a plain <img>.
+    previous = state["files"]
+    files = {}
+    stats = {"hashed": 0, "errors": []}
+    for directory, _, names in os.walk(static_dir):
+        for name in names:
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, static_dir).replace(os.sep, "/")
+            info = os.stat(path)
+            entry = previous.get(relative)
+            if entry is None or entry["size"] != info.st_size or entry["mtime"] != info.st_mtime_ns:
+                try:
+                    width, height = image_size(path)
+                except (OSError, ValueError) as e:
+                    stats["errors"].append((relative, f"{type(e).__name__}: {e}"))
+                    continue
+                entry = {"size": info.st_size, "mtime": info.st_mtime_ns, "hash": hash_file(path), "width": width, "height": height}
+                stats["hashed"] += 1
+            files[relative] = entry
+    state["files"] = files
+    return files, stats
+
+
+def image_props(relative, entry, variants):
+    # The extra <img> props for one source; variants is [(width, name)] smallest first
+    props = {"width": entry["width"], "height": entry["height"]}
+    if variants:
+        candidates = [f"/{name} {width}w" for width, name in variants] + [f"/{relative} {entry['width']}w"]
+        props["srcset"] = ", ".join(candidates)
+        props["sizes"] = "100vw"
+    return props
+
+
+def process_images(static_dir, dest_dir, widths=DEFAULT_WIDTHS, workers=None, state_path=DEFAULT_IMAGE_STATE_PATH, store_dir=DEFAULT_IMAGE_STORE):
+    # Resizes every image under static_dir to each of widths, keeping the results in store_dir by
+    # source hash so an unchanged image is never resized again, and publishes them next to the
+    # originals in dest_dir. Returns (table for functions.set_image_table, stats).
+    if Image is None:
+        raise ValueError("Error: resizing images needs the Pillow package (pip install Pillow)")
+    if not os.path.isdir(static_dir):
+        raise ValueError('Error: Invalid source directory - source path is not a directory!')
+    state = load_fingerprint_state(state_path)
+    files, stats = scan_images(static_dir, state)
+    stats.update({"resized": 0, "reused": 0, "written": 0, "removed": 0})
+
+    jobs = []
+    for relative, entry in sorted(files.items()):
+        extension = os.path.splitext(relative)[1].lower()
+        for width in derivative_widths(entry["width"], widths):
+            stored = os.path.join(store_dir, f"{entry['hash']}-{width}w{extension}")
+            if os.path.isfile(stored):
+                stats["reused"] += 1
+            else:
+                jobs.append((relative, os.path.join(static_dir, *relative.split("/")), stored, width))
+    if jobs:
+        os.makedirs(store_dir, exist_ok=True)
+        # Decoding and resampling are CPU bound and hold the GIL, so each image gets a process
+        with ProcessPoolExecutor(max_workers=min(resolve_workers(workers), len(jobs))) as pool:
+            futures = [(relative, pool.submit(resize_image, src, stored, width)) for relative, src, stored, width in jobs]
+            for relative, future in futures:
+                try:
+                    future.result()
+                    stats["resized"] += 1
+                except Exception as e:
+                    stats["errors"].append((relative, f"{type(e).__name__}: {e}"))
+
+    table = {}
+    current = set()
+    for relative, entry in sorted(files.items()):
+        extension = os.path.splitext(relative)[1].lower()
+        variants = []
+        for width in derivative_widths(entry["width"], widths):
+            stored = os.path.join(store_dir, f"{entry['hash']}-{width}w{extension}")
+            if not os.path.isfile(stored):
+                # Failed above; the page just goes without this candidate
+                continue
+            name = derivative_name(relative, width, entry["hash"])
+            dst = os.path.join(dest_dir, *name.split("/"))
+            if not os.path.isfile(dst):
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                _place(stored, dst)
+                stats["written"] += 1
+            variants.append((width, name))
+            current.add(name)
+        table[relative] = image_props(relative, entry, variants)
+
+    for name in state.get("outputs", []):
+        dst = os.path.join(dest_dir, *name.split("/"))
+        if name not in current and os.path.isfile(dst):
+            os.remove(dst)
+            stats["removed"] += 1
+    state["outputs"] = sorted(current)
+    if os.path.isdir(store_dir):
+        # Keep only the derivatives of sources that still exist
+        live = {entry["hash"] for entry in files.values()}
+        for name in os.listdir(store_dir):
+            if name.split("-", 1)[0] not in live:
+                os.remove(os.path.join(store_dir, name))
+    save_fingerprint_state(state_path, state)
+    return table, stats
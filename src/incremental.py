@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import shutil
+
+from depgraph import DependencyGraph, UrlResolver
+from functions import get_precompressor, get_asset_table, get_image_table
+from parallel import collect_page_jobs, render_page_jobs
+
+
+MANIFEST_VERSION = 2
+DEFAULT_MANIFEST_PATH = os.path.join(".build_cache", "manifest.json")
+
+
+def hash_file(path, chunk_size=1 << 16):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def empty_manifest(basepath=None, assets=None, images=None):
+    # Pages record the hash of the template they were rendered with, since templates can differ per directory
+    return {"version": MANIFEST_VERSION, "basepath": basepath, "assets": assets, "images": images, "sources": {}}
+
+
+def asset_table_digest(table):
+    if table is None:
+        return None
+    return hashlib.sha256(json.dumps(table, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_manifest(manifest_path):
+    # A missing or unreadable manifest just means "rebuild everything"
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty_manifest()
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return empty_manifest()
+    return manifest
+
+
+def save_manifest(manifest_path, manifest):
+    directory = os.path.dirname(manifest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def depgraph_path_for(manifest_path):
+    # The dependency graph describes the same build as the manifest, so it lives next to it
+    return os.path.join(os.path.dirname(manifest_path), "deps.json")
+
+
+def discard_manifest(manifest_path):
+    for path in (manifest_path, depgraph_path_for(manifest_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def content_relative(path, dir_path_content):
+    return os.path.relpath(path, dir_path_content).replace(os.sep, "/")
+
+
+def generate_pages_incremental(dir_path_content, template_path, dest_dir_path, basepath, manifest_path=DEFAULT_MANIFEST_PATH, workers=1, profiler=None, include=None, exclude=None, static_dir=None):
+    if not os.path.isdir(dir_path_content):
+        raise ValueError(f"Error: {dir_path_content} does not point to a directory!")
+    if not os.path.isfile(template_path):
+        raise ValueError(f"Error: {template_path} does not point to a valid file!")
+
+    old_manifest = load_manifest(manifest_path)
+    # A new basepath, new asset fingerprints or new image derivatives can change every page, so nothing old can be reused
+    assets = asset_table_digest(get_asset_table())
+    images = asset_table_digest(get_image_table())
+    reusable = old_manifest["basepath"] == basepath and old_manifest.get("assets") == assets and old_manifest.get("images") == images
+    old_sources = old_manifest["sources"] if reusable else {}
+    depgraph_path = depgraph_path_for(manifest_path)
+    graph = DependencyGraph.load(depgraph_path) if old_sources else DependencyGraph()
+
+    manifest = empty_manifest(basepath, assets, images)
+    stats = {"rendered": 0, "invalidated": 0, "copied": 0, "skipped": 0, "removed": 0, "errors": []}
+    template_hashes = {}
+    dirty_pages = []
+    unmapped_pages = []
+    precompressor = get_precompressor()
+
+    def is_fresh(source, entry):
+        previous = old_sources.get(source)
+        return previous is not None and previous == entry and os.path.isfile(entry["output"])
+
+    pages, copies = collect_page_jobs(dir_path_content, dest_dir_path, template_path, include, exclude)
+    # Links and images resolve against what this build produces, so added or removed pages are visible
+    produced = {content_relative(src, dir_path_content) for src, _, _ in pages}
+    produced.update(content_relative(src, dir_path_content) for src, _ in copies)
+    resolver = UrlResolver(dir_path_content, static_dir, content_files=produced)
+
+    for src, dst, template in pages:
+        if template not in template_hashes:
+            template_hashes[template] = hash_file(template)
+        entry = {"hash": hash_file(src), "output": dst, "template": template_hashes[template]}
+        manifest["sources"][src] = entry
+        if not is_fresh(src, entry):
+            dirty_pages.append((src, dst, template))
+        elif src not in graph.pages:
+            # Unchanged, but its dependencies were never recorded (first run with a dependency graph)
+            unmapped_pages.append((src, dst, template))
+            stats["skipped"] += 1
+        elif graph.is_stale(src, resolver):
+            # The page itself is unchanged but an image it shows or a page it links to changed
+            dirty_pages.append((src, dst, template))
+            stats["invalidated"] += 1
+        else:
+            stats["skipped"] += 1
+    if precompressor is not None:
+        # Rendered pages are handed over when they are written; skipped ones just get checked
+        dirty_outputs = {dst for _, dst, _ in dirty_pages}
+        for _, dst, _ in pages:
+            if dst not in dirty_outputs:
+                precompressor.submit(dst)
+
+    for src, dst in copies:
+        entry = {"hash": hash_file(src), "output": dst}
+        manifest["sources"][src] = entry
+        if is_fresh(src, entry):
+            stats["skipped"] += 1
+        else:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copy(src, dst)
+            stats["copied"] += 1
+        if precompressor is not None:
+            precompressor.submit(dst)
+
+    seen_sources = set(manifest["sources"])
+    errors = render_page_jobs(dirty_pages, basepath, workers, profiler)
+    # Failed pages stay out of the manifest so the next build retries them
+    failed = {source for source, _ in errors}
+    for source in failed:
+        del manifest["sources"][source]
+        graph.remove_page(source)
+    for src, dst, template in dirty_pages + unmapped_pages:
+        if src not in failed:
+            graph.record_page(src, dst, template, resolver)
+    stats["rendered"] = len(dirty_pages) - len(errors)
+    stats["errors"] = errors
+
+    # Outputs whose source disappeared are stale; check every old entry, not just reusable ones
+    current_outputs = {entry["output"] for entry in manifest["sources"].values()}
+    for source, entry in old_manifest["sources"].items():
+        if source in seen_sources or entry["output"] in current_outputs:
+            continue
+        graph.remove_page(source)
+        if os.path.isfile(entry["output"]):
+            print(f"Removing {entry['output']} (source {source} was deleted)")
+            os.remove(entry["output"])
+            stats["removed"] += 1
+        if precompressor is not None:
+            precompressor.forget(entry["output"])
+
+    for source in list(graph.pages):
+        if source not in seen_sources:
+            graph.remove_page(source)
+
+    save_manifest(manifest_path, manifest)
+    graph.save(depgraph_path)
+    return stats
@@ -1,14 +1,319 @@
-from textnode import TextNode, TextType
-from htmlnode import HTMLNode, LeafNode, ParentNode
-from functions import text_node_to_html_node, publish_static, generate_pages_recursive
+import argparse
+import contextlib
+import os
 import sys
 
+from async_build import generate_pages_async
+from compress import Precompressor, available_formats, DEFAULT_COMPRESS_STATE_PATH, DEFAULT_COMPRESS_STORE
+from depgraph import DependencyGraph, UrlResolver, build_dependency_graph
+from fingerprint import fingerprint_static, DEFAULT_FINGERPRINT_STATE_PATH
+from functions import publish_static, generate_pages_recursive, set_block_cache, set_text_collector, set_precompressor, set_asset_table, set_image_table, set_content_shard
+from images import Image, process_images, DEFAULT_WIDTHS, DEFAULT_IMAGE_STATE_PATH, DEFAULT_IMAGE_STORE
+from incremental import generate_pages_incremental, discard_manifest, depgraph_path_for, load_manifest, DEFAULT_MANIFEST_PATH
+from parallel import generate_pages_parallel, collect_page_jobs
+from profiling import BuildProfiler
+from render_cache import BlockCache
+from search import SearchCollector, update_search_index
+from server import DevServer, serve
+from shard import ContentShard, parse_shard, default_shard_output, write_shard_manifest, merge_shards
+from sync import sync_static, DEFAULT_SYNC_STATE_PATH
+from watch import SiteWatcher
 
-basepath = "/"
-if len(sys.argv) > 1:
-    basepath = sys.argv[1]
 
-print(basepath)
-publish_static("static", "docs")
-generate_pages_recursive("content", "template.html", "docs", basepath)
+def parse_widths(text):
+    try:
+        widths = tuple(int(width) for width in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{text}' is not a comma-separated list of widths")
+    if not widths or min(widths) < 1:
+        raise argparse.ArgumentTypeError("widths must be positive")
+    return widths
 
+
+def shard_spec(text):
+    try:
+        return parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e).removeprefix("Error: "))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the static site from content/ into docs/.")
+    parser.add_argument("basepath", nargs="?", default="/", help="URL prefix the site is served under")
+    parser.add_argument("--incremental", action="store_true", help="only re-render pages whose inputs changed")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH, help="build manifest used by --incremental")
+    parser.add_argument("--checksum", action="store_true", help="with --incremental, compare static files by content when size matches but mtime differs")
+    parser.add_argument("--hardlink", action="store_true", help="with --incremental, hardlink static files into docs/ instead of copying them")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="number of render processes (0 = one per CPU)")
+    parser.add_argument("--async", dest="async_io", action="store_true", help="overlap reading, rendering and writing pages in an asyncio pipeline (full builds)")
+    parser.add_argument("--io-threads", type=int, default=8, help="threads doing file reads and writes for --async")
+    parser.add_argument("--watch", action="store_true", help="keep running and rebuild whatever changes after the first build")
+    parser.add_argument("--interval", type=float, default=0.2, help="seconds between --watch polls")
+    parser.add_argument("--serve", action="store_true", help="serve the site from memory, rendering pages on request and reloading the browser on changes (no build)")
+    parser.add_argument("--host", default="127.0.0.1", help="address --serve listens on")
+    parser.add_argument("--port", type=int, default=8888, help="port --serve listens on")
+    parser.add_argument("--profile", action="store_true", help="time every build stage of every page and print a report")
+    parser.add_argument("--stats-json", metavar="PATH", help="write the per-page stage timings as JSON to PATH")
+    parser.add_argument("--include", action="append", metavar="GLOB", help="only build content files matching GLOB (relative to content/, repeatable)")
+    parser.add_argument("--exclude", action="append", metavar="GLOB", help="skip content files and directories matching GLOB (repeatable)")
+    parser.add_argument("--block-cache", type=int, default=0, metavar="N", help="reuse rendered HTML for up to N repeated blocks (0 = off)")
+    parser.add_argument("--block-cache-file", metavar="PATH", help="keep the block cache on disk between builds")
+    parser.add_argument("--precompress", action="store_true", help=f"write compressed siblings of pages and static files ({', '.join(available_formats())}) as they are written")
+    parser.add_argument("--compress-threads", type=int, default=4, help="threads compressing for --precompress")
+    parser.add_argument("--fingerprint", action="store_true", help="also publish static files under content-hashed names and point the pages at those")
+    parser.add_argument("--images", action="store_true", help="publish resized copies of static images and give <img> tags width, height and srcset (needs Pillow)")
+    parser.add_argument("--image-widths", type=parse_widths, default=DEFAULT_WIDTHS, metavar="W,W,...", help=f"widths in pixels the --images copies are made at (default {','.join(map(str, DEFAULT_WIDTHS))})")
+    parser.add_argument("--image-workers", type=int, default=0, help="processes resizing for --images (0 = one per CPU)")
+    parser.add_argument("--search", action="store_true", help="build a sharded client-side search index into docs/search/ while rendering")
+    parser.add_argument("--shard", type=shard_spec, metavar="I/N", help="build only shard I of N of the content (split evenly by source size) into its own output directory")
+    parser.add_argument("--merge", nargs="+", metavar="DIR", help="combine the output directories of every --shard build into docs/ instead of building")
+    parser.add_argument("--output", metavar="DIR", help="directory the site is built into (default docs/, or shards/I-of-N with --shard)")
+    parser.add_argument("--check-links", action="store_true", help="after building, report internal links and images that point at nothing and fail if there are any")
+    args = parser.parse_args(argv)
+    if args.search and args.async_io:
+        parser.error("--search cannot be combined with --async")
+    # The watcher only copies changed static files; it never re-hashes or re-resizes them
+    for flag, name in ((args.fingerprint, "--fingerprint"), (args.images, "--images")):
+        if flag and args.watch:
+            parser.error(f"{name} cannot be combined with --watch")
+    # The dev server renders pages into memory on request; it writes no output for these to work on
+    for flag, name in ((args.incremental, "--incremental"), (args.async_io, "--async"), (args.search, "--search"), (args.precompress, "--precompress"), (args.fingerprint, "--fingerprint"), (args.images, "--images")):
+        if flag and args.serve:
+            parser.error(f"{name} cannot be combined with --serve")
+    if args.images and Image is None:
+        parser.error("--images needs the Pillow package (pip install Pillow)")
+    if args.shard is not None:
+        for flag, name in ((args.incremental, "--incremental"), (args.watch, "--watch"), (args.serve, "--serve"), (args.search, "--search"), (args.merge, "--merge")):
+            if flag:
+                parser.error(f"--shard cannot be combined with {name}")
+    if args.output is None:
+        args.output = "docs" if args.shard is None else default_shard_output(*args.shard)
+    return args
+
+
+def report_errors(errors):
+    for source, error in errors:
+        print(f"Error rendering {source}: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def stage(profiler, name):
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name)
+
+
+def state_path(args, default):
+    # Shards built side by side on one machine each keep their own build state
+    if args.shard is None:
+        return default
+    return os.path.join(os.path.dirname(default), "shard-{}-of-{}".format(*args.shard), os.path.basename(default))
+
+
+def fingerprint_assets(args, profiler):
+    if not args.fingerprint:
+        return
+    with stage(profiler, "fingerprint"):
+        table, stats = fingerprint_static("static", args.output, state_path(args, DEFAULT_FINGERPRINT_STATE_PATH))
+    set_asset_table(table)
+    print(f"Fingerprinted {len(table)} static files: hashed {stats['hashed']}, reused {stats['reused']} cached hashes, wrote {stats['written']}, removed {stats['removed']} stale")
+
+
+def resize_images(args, profiler):
+    if not args.images:
+        return 0
+    with stage(profiler, "images"):
+        table, stats = process_images("static", args.output, args.image_widths, args.image_workers, state_path(args, DEFAULT_IMAGE_STATE_PATH), state_path(args, DEFAULT_IMAGE_STORE))
+    set_image_table(table)
+    print(f"Images: {len(table)} sources, resized {stats['resized']} copies, reused {stats['reused']} cached, wrote {stats['written']}, removed {stats['removed']} stale")
+    return report_errors(stats["errors"])
+
+
+def build(args, profiler=None):
+    if args.incremental:
+        with stage(profiler, "static"):
+            synced = sync_static("static", args.output, DEFAULT_SYNC_STATE_PATH, args.checksum, args.hardlink)
+        print(f"Static: copied {synced['copied']} files ({synced['copied_bytes']} bytes), skipped {synced['skipped']} ({synced['skipped_bytes']} bytes), removed {synced['removed']}")
+        fingerprint_assets(args, profiler)
+        images_status = resize_images(args, profiler)
+        with stage(profiler, "pages"):
+            stats = generate_pages_incremental("content", "template.html", args.output, args.basepath, args.manifest, args.workers, profiler, args.include, args.exclude, "static")
+        print(f"Rendered {stats['rendered']} pages ({stats['invalidated']} for changed links or images), copied {stats['copied']} files, skipped {stats['skipped']}, removed {stats['removed']}")
+        return report_errors(stats["errors"]) or images_status
+
+    # A full build wipes docs/, so any manifest describing it is now wrong
+    if args.shard is None:
+        discard_manifest(args.manifest)
+    with stage(profiler, "static"):
+        publish_static("static", args.output)
+    fingerprint_assets(args, profiler)
+    images_status = resize_images(args, profiler)
+    with stage(profiler, "pages"):
+        return build_pages(args, profiler) or images_status
+
+
+def build_pages(args, profiler):
+    if args.async_io:
+        return report_errors(generate_pages_async("content", "template.html", args.output, args.basepath, args.workers, args.io_threads, include=args.include, exclude=args.exclude))
+    if args.workers == 1 and profiler is None:
+        generate_pages_recursive("content", "template.html", args.output, args.basepath, args.include, args.exclude)
+        return 0
+    return report_errors(generate_pages_parallel("content", "template.html", args.output, args.basepath, args.workers, profiler, args.include, args.exclude))
+
+
+def check_links(args):
+    if args.incremental:
+        graph = DependencyGraph.load(depgraph_path_for(args.manifest))
+    else:
+        pages, _ = collect_page_jobs("content", args.output, "template.html", args.include, args.exclude)
+        graph = build_dependency_graph(pages, UrlResolver("content", "static"))
+    broken = graph.broken_links()
+    for source, url in broken:
+        print(f"Broken link in {source}: {url}", file=sys.stderr)
+    return 1 if broken else 0
+
+
+def profiled_build(args):
+    if not (args.profile or args.stats_json):
+        return build(args)
+    profiler = BuildProfiler()
+    status = build(args, profiler)
+    if args.profile:
+        print(profiler.report())
+    if args.stats_json:
+        profiler.write_json(args.stats_json)
+    return status
+
+
+def setup_block_cache(args):
+    if not (args.block_cache or args.block_cache_file):
+        return None
+    max_entries = args.block_cache or 4096
+    if args.block_cache_file:
+        cache = BlockCache.load(args.block_cache_file, max_entries)
+    else:
+        cache = BlockCache(max_entries)
+    set_block_cache(cache)
+    return cache
+
+
+def finish_block_cache(cache):
+    if cache is None:
+        return
+    stats = cache.stats()
+    print(f"Block cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), {stats['entries']} entries")
+    if cache.path:
+        cache.save()
+
+
+def setup_precompressor(args):
+    if not args.precompress:
+        return None
+    precompressor = Precompressor(workers=args.compress_threads, state_path=state_path(args, DEFAULT_COMPRESS_STATE_PATH), store_dir=state_path(args, DEFAULT_COMPRESS_STORE))
+    set_precompressor(precompressor)
+    return precompressor
+
+
+def finish_precompressor(precompressor):
+    if precompressor is None:
+        return 0
+    set_precompressor(None)
+    errors = precompressor.close()
+    stats = precompressor.stats
+    print(f"Precompressed {stats['compressed']} variants ({stats['bytes_in']} -> {stats['bytes_out']} bytes), reused {stats['reused']}, {stats['unchanged']} files unchanged")
+    return report_errors(errors)
+
+
+def setup_search(args):
+    if not args.search:
+        return None
+    collector = SearchCollector()
+    set_text_collector(collector)
+    return collector
+
+
+def finish_search(args, collector):
+    if collector is None:
+        return
+    set_text_collector(None)
+    write_search_index(args, collector)
+
+
+def write_search_index(args, collector):
+    if collector is None:
+        return
+    if args.incremental:
+        # Every page still in the manifest, rendered this time or not
+        present = {source: entry["output"] for source, entry in load_manifest(args.manifest)["sources"].items() if "template" in entry}
+    else:
+        present = {source: page["output"] for source, page in collector.pages.items()}
+    stats = update_search_index(collector, present, args.output, args.basepath)
+    print(f"Search index: {stats['pages']} pages in {stats['shards']} shards, {stats['written']} shards written")
+
+
+def setup_shard(args):
+    if args.shard is None:
+        return None
+    shard = ContentShard(*args.shard)
+    set_content_shard(shard)
+    return shard
+
+
+def finish_shard(args, shard):
+    if shard is None:
+        return
+    set_content_shard(None)
+    manifest = write_shard_manifest(shard, args.output, args.basepath)
+    print(f"Shard {shard.index}/{shard.count}: built {len(shard.sources)} of {shard.total} content files, {len(manifest['files'])} files in {args.output}")
+
+
+def merge(args):
+    # docs/ is replaced wholesale, so a manifest describing the old one is now wrong
+    discard_manifest(args.manifest)
+    try:
+        stats = merge_shards(args.merge, args.output)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"Merged {stats['shards']} shards into {args.output}: {stats['files']} files ({stats['duplicates']} identical duplicates)")
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(args.basepath)
+    if args.merge:
+        return merge(args)
+    cache = setup_block_cache(args)
+
+    if args.serve:
+        site = DevServer("content", "static", "template.html", args.basepath, args.include, args.exclude, args.interval)
+        status = serve(site, args.host, args.port)
+        finish_block_cache(cache)
+        return status
+    collector = setup_search(args)
+    precompressor = setup_precompressor(args)
+    shard = setup_shard(args)
+    if not args.watch:
+        status = profiled_build(args)
+        finish_search(args, collector)
+        status = finish_precompressor(precompressor) or status
+        finish_block_cache(cache)
+        if args.check_links:
+            status = check_links(args) or status
+        finish_shard(args, shard)
+        return status
+    # Snapshot before building so edits made during the first build are still picked up
+    watcher = SiteWatcher("content", "static", "template.html", args.output, args.basepath, args.workers, args.interval, args.include, args.exclude)
+    profiled_build(args)
+    # The collector stays installed, and the watcher updates the index from the pages it re-renders
+    write_search_index(args, collector)
+    watcher.run(on_errors=report_errors)
+    set_text_collector(None)
+    finish_precompressor(precompressor)
+    finish_block_cache(cache)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import os
+import shutil
+
+from concurrent.futures import ProcessPoolExecutor
+from functions import generate_page, discover_content, new_page_profile, get_block_cache, set_block_cache, get_text_collector, set_text_collector, get_precompressor, set_precompressor, get_asset_table, set_asset_table, get_image_table, set_image_table, set_discovery_cache, set_content_shard
+from render_cache import BlockCache
+from search import SearchCollector
+
+
+def resolve_workers(workers):
+    if workers is None or workers < 1:
+        return os.cpu_count() or 1
+    return workers
+
+
+def collect_page_jobs(dir_path_content, dest_dir_path, template_path, include=None, exclude=None):
+    # Pages are (source, destination, template) so per-directory templates survive the trip to the pool
+    pages = []
+    copies = []
+    for kind, src, dst, template in discover_content(dir_path_content, dest_dir_path, template_path, include, exclude):
+        if kind == "page":
+            pages.append((src, dst, template))
+        else:
+            copies.append((src, dst))
+    return pages, copies
+
+
+_worker_cache = None
+_worker_collector = None
+
+
+def _init_worker(cache_settings, collect_text=False, asset_table=None, image_table=None):
+    # Each worker gets its own block cache, seeded from the persisted file when there is one,
+    # its own text collector when the parent is building a search index, and the parent's
+    # asset fingerprint and image derivative tables. Every other hook a forked worker inherited
+    # is cleared: the parent submits written pages to its precompressor itself, and discovery
+    # already happened in the parent.
+    global _worker_cache, _worker_collector
+    set_precompressor(None)
+    set_discovery_cache(None)
+    set_content_shard(None)
+    set_asset_table(asset_table)
+    set_image_table(image_table)
+    _worker_collector = SearchCollector() if collect_text else None
+    set_text_collector(_worker_collector)
+    if cache_settings is None:
+        set_block_cache(None)
+        return
+    max_entries, path = cache_settings
+    if path is None:
+        _worker_cache = BlockCache(max_entries)
+    else:
+        _worker_cache = BlockCache.load(path, max_entries, track_new=True)
+    set_block_cache(_worker_cache)
+
+
+def _render_job(job):
+    from_path, template_path, dest_path, basepath, profiled = job
+    profile = new_page_profile() if profiled else None
+    cache = _worker_cache
+    if cache is not None:
+        hits, misses = cache.hits, cache.misses
+    try:
+        generate_page(from_path, template_path, dest_path, basepath, profile)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    # Only workers report cache activity; in the serial path the parent's cache saw it directly
+    cache_report = None
+    if cache is not None:
+        cache_report = (cache.hits - hits, cache.misses - misses, cache.take_new())
+    collected = None if _worker_collector is None else _worker_collector.take_pages()
+    return from_path, error, profile, cache_report, collected
+
+
+def render_page_jobs(pages, basepath, workers=1, profiler=None):
+    # Returns a list of (source, error message) for every page that failed
+    profiled = profiler is not None
+    jobs = [(src, template, dst, basepath, profiled) for src, dst, template in pages]
+    for _, dst, _ in pages:
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+
+    workers = min(resolve_workers(workers), max(len(jobs), 1))
+    cache = get_block_cache()
+    collector = get_text_collector()
+    if workers == 1:
+        results = list(map(_render_job, jobs))
+    else:
+        cache_settings = None if cache is None else (cache.max_entries, cache.path)
+        # Batch jobs so small pages don't pay one IPC round trip each
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_settings, collector is not None, get_asset_table(), get_image_table())) as pool:
+            results = list(pool.map(_render_job, jobs, chunksize=chunksize))
+
+    precompressor = get_precompressor()
+    if precompressor is not None and workers > 1:
+        # _init_worker clears the workers' precompressor; in the serial path generate_page submitted already
+        for (_, _, dst, _, _), (_, error, _, _, _) in zip(jobs, results):
+            if error is None:
+                precompressor.submit(dst)
+
+    for src, _, profile, cache_report, collected in results:
+        if collector is not None and collected:
+            collector.pages.update(collected)
+        if profiled and profile is not None:
+            profiler.record_page(src, profile)
+        if cache is not None and cache_report is not None:
+            hits, misses, new_entries = cache_report
+            cache.hits += hits
+            cache.misses += misses
+            for key, html in new_entries:
+                cache.put(key, html)
+    return [(src, error) for src, error, _, _, _ in results if error is not None]
+
+
+def generate_pages_parallel(dir_path_content, template_path, dest_dir_path, basepath, workers=None, profiler=None, include=None, exclude=None):
+    if not os.path.exists(dir_path_content):
+        raise ValueError(f"Error: dir_path_content '{dir_path_content}' does not exist!")
+    if not os.path.exists(template_path):
+        raise ValueError(f"Error: template_path '{template_path}' does not exist!")
+    if not os.path.isdir(dir_path_content):
+        raise ValueError(f"Error: {dir_path_content} does not point to a directory!")
+    if not os.path.isfile(template_path):
+        raise ValueError(f"Error: {template_path} does not point to a valid file!")
+
+    pages, copies = collect_page_jobs(dir_path_content, dest_dir_path, template_path, include, exclude)
+    precompressor = get_precompressor()
+    for src, dst in copies:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy(src, dst)
+        if precompressor is not None:
+            precompressor.submit(dst)
+    return render_page_jobs(pages, basepath, workers, profiler)
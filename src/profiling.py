@@ -0,0 +1,67 @@
+import json
+import time
+
+from contextlib import contextmanager
+
+
+PAGE_STAGES = ("read", "blocks", "classify", "inline", "to_html", "template", "write")
+
+
+class BuildProfiler():
+    def __init__(self):
+        self.pages = {}
+        self.build_stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.build_stages[name] = self.build_stages.get(name, 0.0) + time.perf_counter() - started
+
+    def record_page(self, source, profile):
+        self.pages[source] = profile
+
+    def totals(self):
+        stages = {stage: 0.0 for stage in PAGE_STAGES}
+        nodes = 0
+        written = 0
+        for profile in self.pages.values():
+            for stage, seconds in profile["stages"].items():
+                stages[stage] = stages.get(stage, 0.0) + seconds
+            nodes += profile["nodes"]
+            written += profile["bytes"]
+        return {"pages": len(self.pages), "stages": stages, "nodes": nodes, "bytes": written}
+
+    def slowest_pages(self, count=10):
+        ranked = sorted(self.pages.items(), key=lambda item: item[1]["total"], reverse=True)
+        return ranked[:count]
+
+    def to_dict(self, top=10):
+        return {
+            "build": self.build_stages,
+            "totals": self.totals(),
+            "slowest": [source for source, _ in self.slowest_pages(top)],
+            "pages": self.pages,
+        }
+
+    def write_json(self, path, top=10):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(top), f, indent=1, sort_keys=True)
+
+    def report(self, top=10):
+        totals = self.totals()
+        lines = ["Build stages:"]
+        for stage, seconds in self.build_stages.items():
+            lines.append(f"  {stage:<10}{seconds:>10.4f}s")
+        page_time = sum(totals["stages"].values()) or 1.0
+        lines.append(f"Page stages ({totals['pages']} pages, {totals['nodes']} nodes, {totals['bytes']} bytes written):")
+        for stage, seconds in sorted(totals["stages"].items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {stage:<10}{seconds:>10.4f}s {100 * seconds / page_time:>6.1f}%")
+        lines.append(f"Slowest {top} pages:")
+        for source, profile in self.slowest_pages(top):
+            stage, seconds = max(profile["stages"].items(), key=lambda item: item[1])
+            share = 100 * seconds / (profile["total"] or 1.0)
+            lines.append(f"  {profile['total']:>8.4f}s  {source}  (mostly {stage}, {share:.0f}%)")
+        return "\n".join(lines)
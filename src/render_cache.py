@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import threading
+
+from collections import OrderedDict
+
+
+CACHE_FORMAT = 1
+DEFAULT_BLOCK_CACHE_PATH = os.path.join(".build_cache", "blocks.json")
+RENDERER_SOURCES = ("functions.py", "htmlnode.py", "textnode.py")
+
+
+def renderer_fingerprint():
+    # Cached HTML is only valid for the code that produced it, so a persisted cache is tied to these sources
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in RENDERER_SOURCES:
+        with open(os.path.join(directory, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class BlockCache():
+    def __init__(self, max_entries=4096, path=None, track_new=False):
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Worker processes hand the fragments they rendered back to the parent, which owns the file
+        self.track_new = track_new
+        self.new_entries = []
+        # The dev server renders on several threads at once; a put evicting the key between a
+        # get's lookup and its move_to_end would otherwise raise KeyError
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            html = self.entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, html):
+        with self.lock:
+            self.entries[key] = html
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            if self.track_new:
+                self.new_entries.append((key, html))
+
+    def take_new(self):
+        with self.lock:
+            new_entries = self.new_entries
+            self.new_entries = []
+            return new_entries
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self, path=None):
+        path = path or self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "format": CACHE_FORMAT,
+            "renderer": renderer_fingerprint(),
+            "entries": [[block_type, block, html] for (block_type, block), html in self.entries.items()],
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, max_entries=4096, track_new=False):
+        cache = cls(max_entries, path, track_new)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cache
+        if not isinstance(data, dict) or data.get("format") != CACHE_FORMAT or data.get("renderer") != renderer_fingerprint():
+            return cache
+        # Oldest entries were written first, so the most recent ones survive a smaller limit
+        for block_type, block, html in data["entries"][-max_entries:]:
+            cache.entries[(block_type, block)] = html
+        return cache
@@ -0,0 +1,210 @@
+import base64
+import json
+import os
+import re
+
+from functions import extract_title, markdown_to_html_node, set_text_collector, get_precompressor
+
+
+SEARCH_STATE_VERSION = 1
+DEFAULT_SEARCH_STATE_PATH = os.path.join(".build_cache", "search.json")
+SEARCH_DIR_NAME = "search"
+PREFIX_LENGTH = 2
+TERM_RE = re.compile(r"[a-z0-9]{2,}")
+
+
+def tokenize(text):
+    return TERM_RE.findall(text.lower())
+
+
+class SearchCollector():
+    # Installed with functions.set_text_collector; generate_page reports each page's title and
+    # inline text, and only pages that were written successfully are kept
+    def __init__(self):
+        self.pages = {}
+        self.current = None
+
+    def start_page(self, source, output, title):
+        self.current = (source, {"output": output, "title": title, "terms": set(tokenize(title))})
+
+    def add(self, text_nodes):
+        if self.current is None:
+            return
+        terms = self.current[1]["terms"]
+        for node in text_nodes:
+            terms.update(tokenize(node.text))
+
+    def end_page(self):
+        source, page = self.current
+        self.pages[source] = page
+        self.current = None
+
+    def take_pages(self):
+        pages = self.pages
+        self.pages = {}
+        return pages
+
+    def index_file(self, source, output):
+        # For pages the build skipped: parse without writing anything
+        with open(source, "r") as f:
+            markdown = f.read()
+        previous = set_text_collector(self)
+        try:
+            self.start_page(source, output, extract_title(markdown))
+            markdown_to_html_node(markdown)
+            self.end_page()
+        finally:
+            set_text_collector(previous)
+
+
+def encode_postings(page_ids):
+    # Sorted ids, delta encoded as LEB128 varints, base64 for JSON
+    packed = bytearray()
+    previous = 0
+    for page_id in sorted(page_ids):
+        delta = page_id - previous
+        previous = page_id
+        while True:
+            byte = delta & 0x7F
+            delta >>= 7
+            if delta:
+                packed.append(byte | 0x80)
+            else:
+                packed.append(byte)
+                break
+    return base64.b64encode(bytes(packed)).decode("ascii")
+
+
+def decode_postings(encoded):
+    page_ids = []
+    current = shift = value = 0
+    for byte in base64.b64decode(encoded):
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            current += value
+            page_ids.append(current)
+            value = shift = 0
+    return page_ids
+
+
+def page_url(output, dest_dir, basepath):
+    relative = os.path.relpath(output, dest_dir).replace(os.sep, "/")
+    if relative == "index.html" or relative.endswith("/index.html"):
+        relative = relative.removesuffix("index.html")
+    return basepath + relative
+
+
+class SearchIndex():
+    def __init__(self):
+        # source -> {"id", "output", "title", "terms"}; ids stay with their page across builds
+        # so a change to one page only touches the shards of its own terms
+        self.pages = {}
+        self.next_id = 0
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if isinstance(data, dict) and data.get("version") == SEARCH_STATE_VERSION:
+            index.pages = data["pages"]
+            index.next_id = data["next_id"]
+        return index
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": SEARCH_STATE_VERSION, "next_id": self.next_id, "pages": self.pages}, f)
+        os.replace(tmp_path, path)
+
+    def update(self, rendered, present):
+        # rendered: source -> collected page; present: every page source the site now has
+        for source in [source for source in self.pages if source not in present]:
+            del self.pages[source]
+        for source, page in rendered.items():
+            if source not in present:
+                continue
+            entry = self.pages.get(source)
+            if entry is None:
+                entry = {"id": self.next_id}
+                self.next_id += 1
+            entry.update(output=page["output"], title=page["title"], terms=sorted(page["terms"]))
+            self.pages[source] = entry
+
+    def shards(self):
+        postings = {}
+        for entry in self.pages.values():
+            for term in entry["terms"]:
+                postings.setdefault(term, []).append(entry["id"])
+        shards = {}
+        for term, page_ids in postings.items():
+            shards.setdefault(term[:PREFIX_LENGTH], {})[term] = encode_postings(page_ids)
+        return shards
+
+    def write(self, output_dir, dest_dir, basepath):
+        # Shards are only rewritten when their bytes change; returns how many were written
+        os.makedirs(output_dir, exist_ok=True)
+        precompressor = get_precompressor()
+        shards = self.shards()
+        written = 0
+        for prefix, terms in shards.items():
+            path = os.path.join(output_dir, f"{prefix}.json")
+            data = json.dumps(terms, sort_keys=True, separators=(",", ":")).encode("utf-8")
+            if _write_if_changed(path, data):
+                written += 1
+            if precompressor is not None:
+                precompressor.submit(path)
+        for name in os.listdir(output_dir):
+            if name.endswith(".json") and name != "index.json" and name[:-5] not in shards:
+                os.remove(os.path.join(output_dir, name))
+                if precompressor is not None:
+                    precompressor.forget(os.path.join(output_dir, name))
+
+        pages = [None] * self.next_id
+        for entry in self.pages.values():
+            pages[entry["id"]] = [page_url(entry["output"], dest_dir, basepath), entry["title"]]
+        meta = {"version": SEARCH_STATE_VERSION, "prefix_length": PREFIX_LENGTH, "pages": pages, "shards": sorted(shards)}
+        _write_if_changed(os.path.join(output_dir, "index.json"), json.dumps(meta, separators=(",", ":")).encode("utf-8"))
+        if precompressor is not None:
+            precompressor.submit(os.path.join(output_dir, "index.json"))
+        return written, len(shards)
+
+
+def _write_if_changed(path, data):
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def update_search_index(collector, present, dest_dir, basepath, state_path=DEFAULT_SEARCH_STATE_PATH):
+    # present: source -> output for every page of the site. Pages the build rendered were collected
+    # on the way; pages it skipped and the index has never seen are parsed here
+    rendered = collector.take_pages()
+    index = SearchIndex.load(state_path)
+    for source, output in present.items():
+        if source not in rendered and source not in index.pages:
+            try:
+                collector.index_file(source, output)
+            except Exception:
+                # The build reports broken pages; they just stay out of the index
+                continue
+    rendered.update(collector.take_pages())
+    index.update(rendered, present)
+    written, shards = index.write(os.path.join(dest_dir, SEARCH_DIR_NAME), dest_dir, basepath)
+    index.save(state_path)
+    return {"pages": len(index.pages), "shards": shards, "written": written}
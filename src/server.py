@@ -0,0 +1,213 @@
+import mimetypes
+import os
+import posixpath
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, unquote
+from functions import render_page, page_template, is_page_source, is_content_included, PAGE_SUFFIX, TEMPLATE_NAME
+from watch import scan_tree, diff_snapshots
+
+
+LIVE_RELOAD_PATH = "/__livereload"
+LIVE_RELOAD_SCRIPT = f'<script>new EventSource("{LIVE_RELOAD_PATH}").onmessage = function () {{ location.reload(); }};</script>'
+
+
+def _file_version(path):
+    info = os.stat(path)
+    return info.st_mtime_ns, info.st_size
+
+
+def inject_live_reload(html):
+    index = html.rfind("</body>")
+    if index == -1:
+        return html + LIVE_RELOAD_SCRIPT
+    return html[:index] + LIVE_RELOAD_SCRIPT + html[index:]
+
+
+class DevServer():
+    # Serves the site straight from content/ and static/: pages are rendered the first time they
+    # are asked for and kept in memory until the source or its template changes on disk
+    def __init__(self, content_dir, static_dir, template_path, basepath="/", include=None, exclude=None, interval=0.2):
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.template_path = template_path
+        self.basepath = basepath if basepath.endswith("/") else basepath + "/"
+        self.include = include
+        self.exclude = exclude
+        self.interval = interval
+        self.pages = {}
+        self.lock = threading.Lock()
+        # Bumped on every change seen on disk; live reload clients wait on it
+        self.generation = 0
+        self.changed = threading.Condition()
+        self.snapshot = None
+        self.stopped = threading.Event()
+
+    def resolve(self, url):
+        # Returns ("page", source), ("file", path), ("redirect", location) or None
+        path = unquote(urlsplit(url).path)
+        if not path.startswith(self.basepath):
+            return None
+        relative = posixpath.normpath("/" + path[len(self.basepath):]).lstrip("/")
+        if path.endswith("/") or relative == "":
+            relative = posixpath.join(relative, "index.html")
+
+        if relative.endswith(".html"):
+            source = self.content_path(relative.removesuffix(".html") + PAGE_SUFFIX)
+            if os.path.isfile(source) and self.is_included(source):
+                return "page", source
+        for root in (self.content_dir, self.static_dir):
+            candidate = os.path.join(root, *relative.split("/"))
+            if os.path.isfile(candidate):
+                name = os.path.basename(candidate)
+                if root == self.content_dir and (is_page_source(name) or name == TEMPLATE_NAME or not self.is_included(candidate)):
+                    continue
+                return "file", candidate
+            if os.path.isdir(candidate) and not path.endswith("/"):
+                # Relative links inside the index page only work with the trailing slash
+                return "redirect", path + "/"
+        return None
+
+    def content_path(self, relative):
+        return os.path.join(self.content_dir, *relative.split("/"))
+
+    def is_included(self, path):
+        relative = os.path.relpath(path, self.content_dir).replace(os.sep, "/")
+        return is_content_included(relative, self.include, self.exclude)
+
+    def render(self, source):
+        template = page_template(self.content_dir, self.template_path, source)
+        version = (template, _file_version(source), _file_version(template))
+        with self.lock:
+            cached = self.pages.get(source)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        print(f"Rendering {source} using {template}")
+        with open(source, "r") as f:
+            markdown = f.read()
+        html = inject_live_reload(render_page(markdown, template, self.basepath))
+        with self.lock:
+            self.pages[source] = (version, html)
+        return html
+
+    def scan(self):
+        snapshot = scan_tree(self.content_dir)
+        snapshot.update(scan_tree(self.static_dir))
+        if os.path.isfile(self.template_path):
+            snapshot[self.template_path] = _file_version(self.template_path)
+        return snapshot
+
+    def poll(self):
+        snapshot = self.scan()
+        if self.snapshot is None:
+            self.snapshot = snapshot
+            return False
+        changed, removed = diff_snapshots(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        if not changed and not removed:
+            return False
+        with self.lock:
+            for path in removed:
+                self.pages.pop(path, None)
+        with self.changed:
+            self.generation += 1
+            self.changed.notify_all()
+        return True
+
+    def watch(self):
+        self.poll()
+        while not self.stopped.wait(self.interval):
+            self.poll()
+
+    def wait_for_change(self, generation, timeout):
+        with self.changed:
+            self.changed.wait_for(lambda: self.generation != generation or self.stopped.is_set(), timeout)
+            return self.generation
+
+
+def make_handler(site):
+    class DevRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if urlsplit(self.path).path == LIVE_RELOAD_PATH:
+                self.stream_reloads()
+                return
+            target = site.resolve(self.path)
+            if target is None:
+                self.send_error(404)
+                return
+            kind, value = target
+            if kind == "redirect":
+                self.send_response(301)
+                self.send_header("Location", value)
+                self.end_headers()
+                return
+            if kind == "page":
+                try:
+                    body = site.render(value).encode("utf-8")
+                except Exception as e:
+                    # Keep the reload script on error pages so fixing the source brings the page back
+                    body = inject_live_reload(f"<pre>Error rendering {value}: {type(e).__name__}: {e}</pre>").encode("utf-8")
+                    self.send_body(500, "text/html; charset=utf-8", body)
+                    return
+                self.send_body(200, "text/html; charset=utf-8", body)
+                return
+            with open(value, "rb") as f:
+                body = f.read()
+            self.send_body(200, mimetypes.guess_type(value)[0] or "application/octet-stream", body)
+
+        def send_body(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def stream_reloads(self):
+            # Server-sent events: one "reload" message per change, comments in between keep the connection open
+            generation = site.generation
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            try:
+                while not site.stopped.is_set():
+                    current = site.wait_for_change(generation, timeout=15)
+                    if current != generation:
+                        generation = current
+                        self.wfile.write(b"data: reload\n\n")
+                    else:
+                        self.wfile.write(b": ping\n\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return DevRequestHandler
+
+
+def start_server(site, host="127.0.0.1", port=8888):
+    httpd = ThreadingHTTPServer((host, port), make_handler(site))
+    httpd.daemon_threads = True
+    threading.Thread(target=site.watch, daemon=True).start()
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def stop_server(site, httpd):
+    site.stopped.set()
+    with site.changed:
+        site.changed.notify_all()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def serve(site, host="127.0.0.1", port=8888):
+    httpd = start_server(site, host, port)
+    print(f"Serving {site.content_dir} and {site.static_dir} at http://{host}:{httpd.server_address[1]}{site.basepath} (Ctrl+C to stop)")
+    try:
+        site.stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    stop_server(site, httpd)
+    return 0
@@ -0,0 +1,163 @@
+import hashlib
+import heapq
+import json
+import os
+import shutil
+
+from incremental import hash_file, content_relative
+
+
+SHARD_FORMAT = 1
+# Written into each shard's output directory; describes the shard and is left out of the merge
+SHARD_MANIFEST_NAME = ".shard.json"
+
+
+def parse_shard(text):
+    # "2/4" -> (2, 4); shards are numbered from 1
+    index, _, count = text.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Error: invalid shard '{text}', expected I/N such as 1/4")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Error: invalid shard '{text}', I must be between 1 and N")
+    return index, count
+
+
+def default_shard_output(index, count):
+    return os.path.join("shards", f"{index}-of-{count}")
+
+
+def assign_shards(sizes, count):
+    # {relative: bytes} -> {relative: shard number from 1}. Largest first, each to the shard with the
+    # least bytes so far; ties go by path and shard number, so every node computes the same split.
+    loads = [(0, index) for index in range(1, count + 1)]
+    assignment = {}
+    for relative in sorted(sizes, key=lambda relative: (-sizes[relative], relative)):
+        load, index = heapq.heappop(loads)
+        assignment[relative] = index
+        heapq.heappush(loads, (load + sizes[relative], index))
+    return assignment
+
+
+def plan_digest(assignment, count):
+    return hashlib.sha256(json.dumps([count, sorted(assignment.items())]).encode("utf-8")).hexdigest()
+
+
+class ContentShard():
+    # The discover_content filter for one shard (functions.set_content_shard). It also remembers the
+    # split it made, which goes into the shard manifest so the merge can tell the shards agree.
+    def __init__(self, index, count):
+        self.index = index
+        self.count = count
+        self.plan = None
+        self.total = 0
+        self.sources = []
+
+    def select(self, items, content_dir):
+        sizes = {content_relative(src, content_dir): os.stat(src).st_size for _, src, _, _ in items}
+        assignment = assign_shards(sizes, self.count)
+        self.plan = plan_digest(assignment, self.count)
+        self.total = len(assignment)
+        selected = [item for item in items if assignment[content_relative(item[1], content_dir)] == self.index]
+        self.sources = sorted(content_relative(src, content_dir) for _, src, _, _ in selected)
+        return selected
+
+
+def output_files(output_dir):
+    # {"/"-separated path: sha256} of everything a shard wrote, except its manifest
+    files = {}
+    for directory, _, names in os.walk(output_dir):
+        for name in names:
+            relative = os.path.relpath(os.path.join(directory, name), output_dir).replace(os.sep, "/")
+            if relative != SHARD_MANIFEST_NAME:
+                files[relative] = hash_file(os.path.join(directory, name))
+    return files
+
+
+def write_shard_manifest(shard, output_dir, basepath):
+    if shard.plan is None:
+        raise ValueError("Error: the shard was never split; nothing was discovered in the content directory")
+    manifest = {
+        "format": SHARD_FORMAT,
+        "shard": shard.index,
+        "count": shard.count,
+        "plan": shard.plan,
+        "total": shard.total,
+        "basepath": basepath,
+        "sources": shard.sources,
+        "files": output_files(output_dir),
+    }
+    path = os.path.join(output_dir, SHARD_MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def load_shard_manifest(output_dir):
+    path = os.path.join(output_dir, SHARD_MANIFEST_NAME)
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        raise ValueError(f"Error: '{output_dir}' is not a finished shard build (no readable {SHARD_MANIFEST_NAME})")
+    if not isinstance(manifest, dict) or manifest.get("format") != SHARD_FORMAT:
+        raise ValueError(f"Error: '{output_dir}' was built by an incompatible version")
+    return manifest
+
+
+def check_shards(shard_dirs, manifests):
+    # Returns a list of problems that make the shards unmergeable
+    problems = []
+    first = manifests[0]
+    for output_dir, manifest in zip(shard_dirs, manifests):
+        for key in ("count", "plan", "basepath"):
+            if manifest[key] != first[key]:
+                problems.append(f"{output_dir} has a different {key} than {shard_dirs[0]}")
+    present = sorted(manifest["shard"] for manifest in manifests)
+    if present != list(range(1, first["count"] + 1)):
+        problems.append(f"expected shards 1 to {first['count']} once each, got {present}")
+
+    owners = {}
+    for manifest in manifests:
+        for source in manifest["sources"]:
+            if source in owners:
+                problems.append(f"{source} was built by shards {owners[source]} and {manifest['shard']}")
+            owners[source] = manifest["shard"]
+    if len(owners) != first["total"]:
+        problems.append(f"the shards built {len(owners)} of {first['total']} content files")
+
+    # Every file must still be what its shard wrote, so a partial copy from another node is caught
+    for output_dir, manifest in zip(shard_dirs, manifests):
+        if output_files(output_dir) != manifest["files"]:
+            problems.append(f"{output_dir} does not match its manifest (changed or incompletely copied)")
+    return problems
+
+
+def merge_shards(shard_dirs, dest_dir):
+    # Combines the output directories of every shard of one build into dest_dir. Files several shards
+    # wrote (static files, fingerprinted copies) must be identical; any difference is a conflict.
+    manifests = [load_shard_manifest(output_dir) for output_dir in shard_dirs]
+    if not manifests:
+        raise ValueError("Error: no shard directories to merge")
+    problems = check_shards(shard_dirs, manifests)
+
+    sources = {}
+    for output_dir, manifest in zip(shard_dirs, manifests):
+        for relative, digest in manifest["files"].items():
+            if relative in sources and sources[relative][1] != digest:
+                problems.append(f"{relative} differs between {sources[relative][0]} and {output_dir}")
+            sources.setdefault(relative, (output_dir, digest))
+    if problems:
+        raise ValueError("Error: cannot merge shards:\n  " + "\n  ".join(problems))
+
+    if os.path.exists(dest_dir):
+        shutil.rmtree(dest_dir)
+    for relative, (output_dir, _) in sorted(sources.items()):
+        dst = os.path.join(dest_dir, *relative.split("/"))
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy2(os.path.join(output_dir, *relative.split("/")), dst)
+    duplicates = sum(len(manifest["files"]) for manifest in manifests) - len(sources)
+    return {"shards": len(manifests), "files": len(sources), "duplicates": duplicates}
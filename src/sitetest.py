@@ -0,0 +1,30 @@
+import os
+import tempfile
+import unittest
+
+
+class SiteTestCase(unittest.TestCase):
+    # A scratch site per test: self.root is a temporary directory removed afterwards, and
+    # self.content, self.static, self.docs and self.template are the usual paths inside it
+    # (none of them created yet)
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.static = os.path.join(self.root, "static")
+        self.docs = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def write(self, path, text):
+        # Text or bytes; missing parent directories are created
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb" if isinstance(text, bytes) else "w") as f:
+            f.write(text)
@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+
+from functions import get_precompressor
+from incremental import hash_file
+
+
+DEFAULT_SYNC_STATE_PATH = os.path.join(".build_cache", "static.json")
+
+
+def scan_files(root):
+    files = {}
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    files[os.path.relpath(entry.path, root)] = entry.stat()
+    return files
+
+
+def load_sync_state(state_path):
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def save_sync_state(state_path, state):
+    directory = os.path.dirname(state_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+
+def _place_file(src, dst, hardlink):
+    # Write next to the target and rename, so readers never see a half-copied file
+    tmp_path = dst + ".sync-tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    if hardlink:
+        try:
+            os.link(src, tmp_path)
+            os.replace(tmp_path, dst)
+            return
+        except OSError:
+            pass
+    # copy2 keeps the mtime, which is what the next sync compares against; on Linux
+    # shutil.copyfile already uses os.sendfile, so the bytes never pass through user space
+    shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+def sync_static(source="static", destination="docs", state_path=DEFAULT_SYNC_STATE_PATH, checksum=False, hardlink=False):
+    if not os.path.isdir(source):
+        raise ValueError('Error: Invalid source directory - source path is not a directory!')
+    os.makedirs(destination, exist_ok=True)
+
+    previous = load_sync_state(state_path)
+    precompressor = get_precompressor()
+    state = {}
+    stats = {"copied": 0, "copied_bytes": 0, "skipped": 0, "skipped_bytes": 0, "removed": 0}
+
+    for relative, src_stat in sorted(scan_files(source).items()):
+        src = os.path.join(source, relative)
+        dst = os.path.join(destination, relative)
+        entry = {"size": src_stat.st_size, "mtime": src_stat.st_mtime_ns}
+        old_entry = previous.get(relative)
+        if old_entry is not None and old_entry.get("size") == entry["size"] and old_entry.get("mtime") == entry["mtime"] and "hash" in old_entry:
+            entry["hash"] = old_entry["hash"]
+        state[relative] = entry
+
+        try:
+            dst_stat = os.stat(dst)
+        except FileNotFoundError:
+            dst_stat = None
+        if dst_stat is not None and dst_stat.st_size == src_stat.st_size:
+            up_to_date = dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+            if not up_to_date and checksum:
+                if "hash" not in entry:
+                    entry["hash"] = hash_file(src)
+                up_to_date = hash_file(dst) == entry["hash"]
+                if up_to_date:
+                    # Same bytes, different mtime: fix the mtime so the cheap check matches next time
+                    os.utime(dst, ns=(dst_stat.st_atime_ns, src_stat.st_mtime_ns))
+            if up_to_date:
+                stats["skipped"] += 1
+                stats["skipped_bytes"] += src_stat.st_size
+                # Unchanged files are cheap for the precompressor, and this restores missing variants
+                if precompressor is not None:
+                    precompressor.submit(dst)
+                continue
+
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        _place_file(src, dst, hardlink)
+        stats["copied"] += 1
+        stats["copied_bytes"] += src_stat.st_size
+        if precompressor is not None:
+            precompressor.submit(dst)
+
+    # Only files this sync put there before can be orphans; generated pages are never touched
+    for relative in previous:
+        if relative in state:
+            continue
+        dst = os.path.join(destination, relative)
+        if os.path.isfile(dst):
+            os.remove(dst)
+            stats["removed"] += 1
+        if precompressor is not None:
+            precompressor.forget(dst)
+
+    save_sync_state(state_path, state)
+    return stats
@@ -0,0 +1,57 @@
+import contextlib
+import io
+import os
+import unittest
+
+from async_build import generate_pages_async
+from functions import generate_pages_recursive
+from sitetest import SiteTestCase
+
+
+class TestGeneratePagesAsync(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.content, "blog"))
+        self.write(self.template, '<title>{{ Title }}</title><a href="/x">{{ Content }}</a>')
+        for i in range(12):
+            self.write(os.path.join(self.content, "blog", f"post{i}.md"), f"# Post {i}\n\nSome **bold** [link](/blog/post{i + 1})")
+        self.write(os.path.join(self.content, "blog", "photo.png"), "png")
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+
+    def read_tree(self, root):
+        files = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                with open(os.path.join(directory, name)) as f:
+                    files[os.path.relpath(os.path.join(directory, name), root)] = f.read()
+        return files
+
+    def build_both(self, **kwargs):
+        serial = self.path("serial")
+        pipelined = self.path("pipelined")
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_pages_recursive(self.content, self.template, serial, "/site/")
+            errors = generate_pages_async(self.content, self.template, pipelined, "/site/", **kwargs)
+        return errors, self.read_tree(serial), self.read_tree(pipelined)
+
+    def test_matches_serial_build(self):
+        errors, serial, pipelined = self.build_both(queue_size=1, io_threads=2)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(serial), 14)
+        self.assertEqual(pipelined, serial)
+
+    def test_failed_page_is_reported_and_others_written(self):
+        self.write(os.path.join(self.content, "blog", "post3.md"), "no title here")
+        os.makedirs(os.path.join(self.content, "bad.md"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            errors = generate_pages_async(self.content, self.template, self.path("out"), "/", queue_size=2)
+        self.assertEqual([source for source, _ in errors], [os.path.join(self.content, "blog", "post3.md")])
+        self.assertEqual(len(self.read_tree(self.path("out"))), 13)
+
+    def test_rejects_empty_queue(self):
+        with self.assertRaises(ValueError):
+            generate_pages_async(self.content, self.template, self.path("out"), "/", queue_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
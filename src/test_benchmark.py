@@ -0,0 +1,30 @@
+import os
+import tempfile
+import unittest
+
+from benchmark import generate_corpus, read_corpus, compare_results, SHAPES
+from functions import markdown_to_html_node, extract_title
+
+
+class TestBenchmarkCorpus(unittest.TestCase):
+    def test_corpus_is_deterministic_and_renders(self):
+        for shape in SHAPES:
+            with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+                content, _, template = generate_corpus(first, pages=12, shape=shape, depth=2, fanout=3, blocks=3, static_files=2, static_size=16)
+                generate_corpus(second, pages=12, shape=shape, depth=2, fanout=3, blocks=3, static_files=2, static_size=16)
+                documents = read_corpus(content)
+                self.assertEqual(documents, read_corpus(os.path.join(second, "content")))
+                self.assertEqual(len(documents), 12)
+                self.assertTrue(os.path.isfile(template))
+                for document in documents:
+                    extract_title(document)
+                    markdown_to_html_node(document).to_html()
+
+    def test_compare_results_flags_regressions(self):
+        previous = {"results": {"fast": {"best": 1.0}, "slow": {"best": 1.0}}}
+        current = {"results": {"fast": {"best": 1.05}, "slow": {"best": 1.5}, "new": {"best": 2.0}}}
+        self.assertEqual(compare_results(previous, current, 0.1), ["slow"])
+
+
+if __name__ == "__main__":
+    unittest.main()
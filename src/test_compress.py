@@ -0,0 +1,131 @@
+import contextlib
+import gzip
+import io
+import os
+import unittest
+
+from concurrent import futures
+from compress import Precompressor
+from functions import publish_static, generate_page, set_precompressor
+from parallel import generate_pages_parallel
+from sitetest import SiteTestCase
+from watch import SiteWatcher
+
+
+class TestPrecompressor(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.state = os.path.join(self.root, "cache", "compress.json")
+        self.store = os.path.join(self.root, "cache", "compressed")
+
+    def tearDown(self):
+        set_precompressor(None)
+        super().tearDown()
+
+    def run_with(self, action):
+        precompressor = Precompressor(formats=("gzip",), workers=2, state_path=self.state, store_dir=self.store)
+        set_precompressor(precompressor)
+        with contextlib.redirect_stdout(io.StringIO()):
+            action()
+        set_precompressor(None)
+        self.assertEqual(precompressor.close(), [])
+        return precompressor.stats
+
+    def test_pages_and_static_files_get_variants(self):
+        self.write(self.path("static", "index.css"), "body { margin: 0 }\n" * 40)
+        self.write(self.path("static", "tiny.css"), "p {}")
+        self.write(self.path("static", "images", "logo.png"), "x" * 1000)
+        self.write(self.path("template.html"), "<title>{{ Title }}</title>{{ Content }}")
+        self.write(self.path("content", "index.md"), "# Home\n\n" + "Some words here. " * 40)
+
+        def build():
+            publish_static(self.path("static"), self.path("docs"))
+            generate_page(self.path("content", "index.md"), self.path("template.html"), self.path("docs", "index.html"), "/")
+
+        stats = self.run_with(build)
+        self.assertEqual(stats["compressed"], 2)
+        for name in ("index.css", "index.html"):
+            with gzip.open(self.path("docs", name + ".gz"), "rb") as f, open(self.path("docs", name), "rb") as original:
+                self.assertEqual(f.read(), original.read())
+        self.assertFalse(os.path.exists(self.path("docs", "tiny.css.gz")))
+        self.assertFalse(os.path.exists(self.path("docs", "images", "logo.png.gz")))
+
+        # A clean rebuild wipes docs/, but unchanged content is restored from the store, not recompressed
+        stats = self.run_with(build)
+        self.assertEqual((stats["compressed"], stats["reused"]), (0, 2))
+
+    def test_unchanged_files_are_skipped_and_changes_recompressed(self):
+        css = self.path("docs", "site.css")
+        self.write(css, "a { color: red }\n" * 40)
+        precompressor = Precompressor(formats=("gzip",), state_path=self.state)
+        precompressor.submit(css)
+        precompressor.close()
+
+        precompressor = Precompressor(formats=("gzip",), state_path=self.state)
+        precompressor.submit(css)
+        precompressor.close()
+        self.assertEqual(precompressor.stats["unchanged"], 1)
+
+        self.write(css, "a { color: blue }\n" * 40)
+        precompressor = Precompressor(formats=("gzip",), state_path=self.state)
+        precompressor.submit(css)
+        precompressor.forget(self.path("docs", "gone.css"))
+        precompressor.close()
+        self.assertEqual(precompressor.stats["compressed"], 1)
+        with gzip.open(css + ".gz", "rt") as f:
+            self.assertIn("blue", f.read())
+
+    def test_parallel_pages_are_compressed_once_by_the_parent(self):
+        submitted = self.path("submitted.txt")
+
+        class RecordingPrecompressor(Precompressor):
+            def submit(self, path):
+                with open(submitted, "a") as f:
+                    f.write(f"{os.getpid()}\n")
+                super().submit(path)
+
+        self.write(self.path("template.html"), "<title>{{ Title }}</title>{{ Content }}")
+        for name in ("a", "b", "c", "d"):
+            self.write(self.path("content", f"{name}.md"), f"# {name}\n\n" + "Some words here. " * 40)
+        precompressor = RecordingPrecompressor(formats=("gzip",), workers=2)
+        set_precompressor(precompressor)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(generate_pages_parallel(self.path("content"), self.path("template.html"), self.path("docs"), "/", 2), [])
+        set_precompressor(None)
+        self.assertEqual(precompressor.close(), [])
+        with open(submitted) as f:
+            self.assertEqual(f.read().split(), [str(os.getpid())] * 4)
+        self.assertEqual(precompressor.stats["compressed"], 4)
+
+    def test_watch_reports_compression_errors_as_they_happen(self):
+        class FailingPrecompressor(Precompressor):
+            def compress_file(self, path):
+                if path.endswith("bad.css"):
+                    raise OSError("disk full")
+                super().compress_file(path)
+
+        self.write(self.path("template.html"), "{{ Content }}")
+        os.makedirs(self.path("content"))
+        os.makedirs(self.path("static"))
+        watcher = SiteWatcher(self.path("content"), self.path("static"), self.path("template.html"), self.path("docs"), "/")
+        precompressor = FailingPrecompressor(formats=("gzip",), state_path=self.state)
+        set_precompressor(precompressor)
+        self.write(self.path("static", "ok.css"), "a {}\n" * 100)
+        self.write(self.path("static", "bad.css"), "b {}\n" * 100)
+        with contextlib.redirect_stdout(io.StringIO()):
+            errors = watcher.poll()
+            futures.wait([future for _, future in precompressor.futures])
+            errors += watcher.poll()
+        self.assertEqual(errors, [(self.path("docs", "bad.css"), "OSError: disk full")])
+        # Finished futures are dropped on each poll instead of piling up for the whole session
+        self.assertEqual(precompressor.futures, [])
+        self.assertTrue(os.path.isfile(self.path("docs", "ok.css.gz")))
+        self.assertEqual(precompressor.close(), [])
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            Precompressor(formats=("zstd",))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import contextlib
+import io
+import os
+import threading
+import unittest
+
+from daemon import BuildDaemon, DiscoveryCache, start_daemon, send_request, parse_args, main
+from functions import discover_content, set_discovery_cache
+from sitetest import SiteTestCase
+
+
+class TestDiscoveryCache(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.content, "blog"))
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post")
+        self.cache = DiscoveryCache()
+        set_discovery_cache(self.cache)
+
+    def tearDown(self):
+        set_discovery_cache(None)
+        super().tearDown()
+
+    def discover(self):
+        return list(discover_content(self.content, "docs", "template.html"))
+
+    def test_listing_is_reused_until_a_directory_changes(self):
+        first = self.discover()
+        self.assertEqual(self.discover(), first)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        # Editing a file leaves the listing alone
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Edited")
+        self.discover()
+        self.assertEqual(self.cache.hits, 2)
+
+        self.write(os.path.join(self.content, "blog", "template.html"), "{{ Content }}")
+        self.write(os.path.join(self.content, "blog", "photo.png"), "png")
+        set_discovery_cache(None)
+        cold = self.discover()
+        set_discovery_cache(self.cache)
+        self.assertEqual(self.discover(), cold)
+        self.assertEqual(self.cache.misses, 2)
+        self.assertIn(("copy", os.path.join(self.content, "blog", "photo.png"), os.path.join("docs", "blog", "photo.png"), None), cold)
+
+
+class TestBuildDaemon(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cwd = os.getcwd()
+        os.chdir(self.root)
+        os.makedirs(os.path.join("content", "blog"))
+        os.makedirs("static")
+        self.write("template.html", '<link href="/index.css"><title>{{ Title }}</title>{{ Content }}')
+        self.write(os.path.join("content", "index.md"), "# Home\n\nSee [the blog](/blog/)")
+        self.write(os.path.join("content", "blog", "index.md"), "# Blog\n\n- one\n- two")
+        self.write(os.path.join("static", "index.css"), "body {}")
+        self.socket_path = os.path.join(self.root, "daemon.sock")
+        self.daemon = BuildDaemon(self.root)
+        self.server = start_daemon(self.daemon, self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        super().tearDown()
+
+    def request(self, command="build", argv=None, cwd=None):
+        out = io.StringIO()
+        err = io.StringIO()
+        request = {"command": command}
+        if command == "build":
+            request.update(argv=argv or [], cwd=cwd or self.root)
+        reply = send_request(request, self.socket_path, out, err)
+        return reply, out.getvalue(), err.getvalue()
+
+    def snapshot(self):
+        files = {}
+        for directory, _, names in os.walk("docs"):
+            for name in names:
+                with open(os.path.join(directory, name)) as f:
+                    files[os.path.join(directory, name)] = f.read()
+        return files
+
+    def test_builds_match_and_leave_no_state_behind(self):
+        reply, out, _ = self.request(argv=["/site/"])
+        self.assertEqual(reply["status"], 0)
+        self.assertIn("Generating page from content/index.md", out)
+        plain = self.snapshot()
+        self.assertIn('<link href="/site/index.css">', plain[os.path.join("docs", "index.html")])
+
+        self.assertEqual(self.request(argv=["/site/", "--fingerprint", "-j", "2"])[0]["status"], 0)
+        self.assertNotIn('href="/site/index.css"', self.snapshot()[os.path.join("docs", "index.html")])
+
+        # The fingerprint table from the last build must not leak into this one
+        self.assertEqual(self.request(argv=["/site/"])[0]["status"], 0)
+        self.assertEqual(self.snapshot(), plain)
+
+        self.assertEqual(self.request(argv=["/site/", "--incremental"])[0]["status"], 0)
+        self.write(os.path.join("content", "blog", "index.md"), "# Blog\n\n- one\n- three")
+        reply, out, _ = self.request(argv=["/site/", "--incremental"])
+        self.assertIn("Rendered 1 pages", out)
+
+        status = self.request("status")[0]
+        self.assertEqual(status["builds"], 5)
+        self.assertGreater(status["discovery_hits"], 0)
+        self.assertGreater(status["cached_blocks"], 0)
+
+    def test_client_forwards_options(self):
+        self.assertEqual(parse_args(["build", "-j", "2", "/site/"]).argv, ["-j", "2", "/site/"])
+        self.assertEqual(parse_args(["--socket", "build", "build", "--", "--incremental"]).argv, ["--incremental"])
+        self.assertEqual(parse_args(["status"]).argv, [])
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(main(["--socket", self.socket_path, "build", "--incremental", "-j", "2", "/site/"]), 0)
+        self.assertIn("Rendered 2 pages", out.getvalue())
+        self.assertTrue(os.path.isfile(os.path.join(".build_cache", "manifest.json")))
+
+    def test_rejected_requests(self):
+        for argv in (["--watch"], ["--wat"], ["/site/", "--serv"]):
+            reply, _, err = self.request(argv=argv)
+            self.assertEqual(reply["status"], 2)
+            self.assertIn("not available through the daemon", err)
+        reply, _, err = self.request(cwd=os.path.join(self.root, "content"))
+        self.assertEqual(reply["status"], 2)
+        reply, _, err = self.request(argv=["--no-such-flag"])
+        self.assertEqual(reply["status"], 2)
+        self.assertIn("unrecognized arguments", err)
+        self.assertFalse(os.path.exists("docs"))
+
+
+if __name__ == "__main__":
+    unittest.main()
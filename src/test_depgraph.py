@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+from depgraph import DependencyGraph, UrlResolver, build_dependency_graph
+from incremental import generate_pages_incremental
+from sitetest import SiteTestCase
+
+
+TEMPLATE = "<title>{{ Title }}</title><body>{{ Content }}</body>"
+
+
+class TestUrlResolver(unittest.TestCase):
+    def test_resolves_pages_and_static_files(self):
+        resolver = UrlResolver("content", "static", content_files={"index.md", "blog/tom/index.md", "blog/post.md"}, static_files={"images/tom.png"})
+        page = os.path.join("content", "blog", "tom", "index.md")
+        self.assertEqual(resolver.resolve("/", page), "content:index.md")
+        self.assertEqual(resolver.resolve("/blog/tom", page), "content:blog/tom/index.md")
+        self.assertEqual(resolver.resolve("../post.html", page), "content:blog/post.md")
+        self.assertEqual(resolver.resolve("/images/tom.png", page), "static:images/tom.png")
+        self.assertIsNone(resolver.resolve("/blog/missing", page))
+        self.assertFalse(resolver.is_internal("https://example.com/a"))
+        self.assertFalse(resolver.is_internal("#top"))
+
+    def test_broken_links_and_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            content = os.path.join(tmp, "content")
+            os.makedirs(content)
+            with open(os.path.join(content, "index.md"), "w") as f:
+                f.write("# Home\n\n[post](/post) [gone](/gone) [out](https://example.com) ![pic](/pic.png)")
+            with open(os.path.join(content, "post.md"), "w") as f:
+                f.write("# Post")
+            resolver = UrlResolver(content, os.path.join(tmp, "static"))
+            pages = [(os.path.join(content, name), None, None) for name in ("index.md", "post.md")]
+            graph = build_dependency_graph(pages, resolver)
+            index = os.path.join(content, "index.md")
+            self.assertEqual(graph.broken_links(), [(index, "/pic.png"), (index, "/gone")])
+
+            path = os.path.join(tmp, "deps.json")
+            graph.save(path)
+            self.assertEqual(DependencyGraph.load(path).pages, graph.pages)
+
+
+class TestCrossPageInvalidation(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manifest = self.path("cache", "manifest.json")
+        os.makedirs(self.content)
+        os.makedirs(self.static)
+        self.write(self.template, TEMPLATE)
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n[about](/about) ![logo](/logo.png)")
+        self.write(os.path.join(self.content, "other.md"), "# Other")
+        self.write(os.path.join(self.static, "logo.png"), "png")
+
+    def build(self):
+        return generate_pages_incremental(self.content, self.template, self.docs, "/", self.manifest, static_dir=self.static)
+
+    def test_changed_image_rerenders_referencing_page(self):
+        self.build()
+        self.write(os.path.join(self.static, "logo.png"), "a bigger png")
+        stats = self.build()
+        self.assertEqual((stats["rendered"], stats["invalidated"], stats["skipped"]), (1, 1, 1))
+        self.assertEqual(self.build()["rendered"], 0)
+
+    def test_link_target_appearing_or_vanishing_rerenders_page(self):
+        self.build()
+        self.write(os.path.join(self.content, "about.md"), "# About")
+        stats = self.build()
+        # about.md itself plus index.md, whose link now resolves
+        self.assertEqual((stats["rendered"], stats["invalidated"]), (2, 1))
+        os.remove(os.path.join(self.content, "about.md"))
+        stats = self.build()
+        self.assertEqual((stats["rendered"], stats["invalidated"], stats["removed"]), (1, 1, 1))
+        self.assertEqual(DependencyGraph.load(self.path("cache", "deps.json")).broken_links(), [(os.path.join(self.content, "index.md"), "/about")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import contextlib
+import io
+import os
+import unittest
+
+from fingerprint import fingerprint_static, fingerprinted_name, load_fingerprint_state
+from functions import load_template, markdown_to_blocks, rewrite_basepath, set_asset_table
+from incremental import generate_pages_incremental, hash_file
+from main import parse_args
+from sitetest import SiteTestCase
+
+
+class TestFingerprint(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.state = self.path("cache", "fingerprints.json")
+        os.makedirs(os.path.join(self.static, "images"))
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.write(os.path.join(self.static, "images", "tom.png"), "png")
+
+    def tearDown(self):
+        set_asset_table(None)
+        super().tearDown()
+
+    def test_fingerprinted_name(self):
+        self.assertEqual(fingerprinted_name("images/tom.png", "0123456789abcdef"), "images/tom.0123456789.png")
+        self.assertEqual(fingerprinted_name("LICENSE", "0123456789abcdef"), "LICENSE.0123456789")
+
+    def test_table_hash_cache_and_stale_outputs(self):
+        table, stats = fingerprint_static(self.static, self.docs, self.state)
+        css = "index." + hash_file(os.path.join(self.static, "index.css"))[:10] + ".css"
+        self.assertEqual(table["index.css"], css)
+        self.assertTrue(os.path.isfile(os.path.join(self.docs, css)))
+        self.assertEqual((stats["hashed"], stats["written"]), (2, 2))
+
+        _, stats = fingerprint_static(self.static, self.docs, self.state)
+        self.assertEqual((stats["hashed"], stats["reused"], stats["written"]), (0, 2, 0))
+
+        self.write(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        table, stats = fingerprint_static(self.static, self.docs, self.state)
+        self.assertEqual((stats["hashed"], stats["written"], stats["removed"]), (1, 1, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.docs, css)))
+        self.assertEqual(sorted(load_fingerprint_state(self.state)["outputs"]), sorted(table.values()))
+
+    def test_references_are_rewritten_in_one_pass(self):
+        table = {"index.css": "index.abc.css", "images/tom.png": "images/tom.def.png"}
+        html = '<link href="/index.css?v=1"><img src="/images/tom.png" alt=""><a href="/blog/">b</a><a href="https://x/index.css">'
+        self.assertEqual(rewrite_basepath(html, "/site/"), html.replace('href="/', 'href="/site/').replace('src="/', 'src="/site/'))
+        set_asset_table(table)
+        self.assertEqual(
+            rewrite_basepath(html, "/site/"),
+            '<link href="/site/index.abc.css?v=1"><img src="/site/images/tom.def.png" alt=""><a href="/site/blog/">b</a><a href="https://x/index.css">',
+        )
+
+        template_path = self.path("template.html")
+        self.write(template_path, '<link href="/index.css">{{ Content }}')
+        template = load_template(template_path, "/")
+        page = template.render_to_string("T", markdown_to_blocks("![Tom](/images/tom.png)"))
+        self.assertEqual(page, '<link href="/index.abc.css"><div><p><img src="/images/tom.def.png" alt="Tom"></img></p></div>')
+
+    def test_new_fingerprints_rerender_incremental_pages(self):
+        content = self.path("content")
+        template = self.path("template.html")
+        manifest = self.path("cache", "manifest.json")
+        os.makedirs(content)
+        self.write(template, '<link href="/index.css">{{ Content }}')
+        self.write(os.path.join(content, "index.md"), "# Home")
+
+        def build():
+            set_asset_table(fingerprint_static(self.static, self.docs, self.state)[0])
+            with contextlib.redirect_stdout(io.StringIO()):
+                return generate_pages_incremental(content, template, self.docs, "/", manifest)
+
+        self.assertEqual(build()["rendered"], 1)
+        self.assertEqual(build()["rendered"], 0)
+        self.write(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        self.assertEqual(build()["rendered"], 1)
+
+    def test_watch_is_rejected(self):
+        # A watch rebuild would copy an edited file but keep pointing pages at its old fingerprinted copy
+        with contextlib.redirect_stderr(io.StringIO()) as err, self.assertRaises(SystemExit):
+            parse_args(["--watch", "--fingerprint"])
+        self.assertIn("--fingerprint cannot be combined with --watch", err.getvalue())
+        self.assertTrue(parse_args(["--fingerprint"]).fingerprint)
+
+
+if __name__ == "__main__":
+    unittest.main()
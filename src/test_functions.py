@@ -1,3 +1,9 @@
+import contextlib
+import io
+import os
+import random
+import re
+import tempfile
 import unittest
 
 from textnode import TextNode, TextType
@@ -5,6 +11,9 @@ from htmlnode import HTMLNode, LeafNode, ParentNode
 from functions import text_node_to_html_node, split_nodes_delimiter, extract_markdown_images
 from functions import extract_markdown_links, split_nodes_image, split_nodes_link, extract_title
 from functions import text_to_textnodes, markdown_to_blocks, block_to_block_type, BlockType, markdown_to_html_node
+from functions import split_template, iter_content_html, CompiledTemplate, load_template
+from functions import discover_content, is_content_included, iter_markdown_blocks, generate_page
+from sitetest import SiteTestCase
 
 class TestTextToHTML(unittest.TestCase):
     def test_text(self):
@@ -141,6 +150,33 @@ class TestSplitNodes(unittest.TestCase):
             new_nodes,
         )
 
+    def full_split(self, nodes, pattern, text_type):
+        # The split without any fast path, as it was written before the patterns were precompiled
+        output = []
+        for node in nodes:
+            if node.text_type != TextType.TEXT:
+                output.append(node)
+                continue
+            pieces = re.split(pattern, node.text)
+            for i in range(0, len(pieces)-1, 3):
+                if pieces[i]:
+                    output.append(TextNode(pieces[i], TextType.TEXT))
+                output.append(TextNode(pieces[i+1], text_type, pieces[i+2]))
+            if pieces[-1]:
+                output.append(TextNode(pieces[-1], TextType.TEXT))
+        return output
+
+    def test_fast_paths_match_full_split(self):
+        rng = random.Random(3)
+        alphabet = ["a", " ", "!", "[", "]", "(", ")", "](", "[x](y)", "![x](y)"]
+        texts = ["", "plain"] + ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12))) for _ in range(1000)]
+        nodes = [TextNode(text, TextType.TEXT) for text in texts] + [TextNode("[x](y)", TextType.BOLD)]
+        self.assertEqual(split_nodes_image(nodes), self.full_split(nodes, r'!\[([^\[\]]*)\]\(([^\(\)]*)\)', TextType.IMAGE))
+        self.assertEqual(split_nodes_link(nodes), self.full_split(nodes, r'(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)', TextType.LINK))
+        for text in texts:
+            self.assertEqual(extract_markdown_images(text), re.findall(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)", text))
+            self.assertEqual(extract_markdown_links(text), re.findall(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)", text))
+
 class TestTextToTextNodes(unittest.TestCase):
     def test_text_to_textnodes(self):
         text = "This is **text** with an _italic_ word and a `code block` and an ![obi wan image](https://i.imgur.com/fJRm4Vk.jpeg) and a [link](https://boot.dev)"
@@ -160,6 +196,33 @@ class TestTextToTextNodes(unittest.TestCase):
             text_to_textnodes(text)
         )
 
+    def chained(self, text):
+        output = [TextNode(text, TextType.TEXT)]
+        output = split_nodes_delimiter(output, "**", TextType.BOLD)
+        output = split_nodes_delimiter(output, "_", TextType.ITALIC)
+        output = split_nodes_delimiter(output, "`", TextType.CODE)
+        output = split_nodes_image(output)
+        return split_nodes_link(output)
+
+    def test_matches_chained_passes(self):
+        cases = [
+            "",
+            "plain text",
+            "**bold** and _it_ and `code`",
+            "**bold with _under_ and `tick`**",
+            "_italic with `tick` and **bold**_",
+            "`code with _under_ and [l](u)`",
+            "unclosed **bold and _italic",
+            "***triple*** and ****",
+            "![i](a_b.png)[l](u)!",
+            "[a](b)![c](d) and ![e](f)[g](h)",
+        ]
+        rng = random.Random(7)
+        alphabet = ["a", " ", "*", "**", "_", "`", "!", "[", "]", "(", ")", "[x](y)", "![x](y)"]
+        cases += ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20))) for _ in range(2000)]
+        for text in cases:
+            self.assertEqual(text_to_textnodes(text), self.chained(text), text)
+
 class TestMarkdownToBlocks(unittest.TestCase):
         def test_markdown_to_blocks(self):
             md = """
@@ -181,6 +244,72 @@ This is the same paragraph on a new line
                 ],
             )
 
+class TestIterMarkdownBlocks(unittest.TestCase):
+    def test_matches_split_without_fenced_blank_lines(self):
+        rng = random.Random(5)
+        alphabet = ["a", " ", "\n", "\n\n", "# h", "- x", "> q", "`"]
+        cases = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30))) for _ in range(2000)]
+        for markdown in cases:
+            if "```" in markdown:
+                continue
+            expected = [block.strip() for block in markdown.split("\n\n") if block.strip() != ""]
+            self.assertEqual(list(iter_markdown_blocks(markdown.split("\n"))), expected, markdown)
+            self.assertEqual(markdown_to_blocks(markdown), expected, markdown)
+
+    def test_fenced_code_keeps_blank_lines(self):
+        md = "# Code\n\n```python\ndef f():\n\n    return 1\n```\n\nAfter ```inline``` code\n\nend"
+        blocks = markdown_to_blocks(md)
+        self.assertEqual(blocks, ["# Code", "```python\ndef f():\n\n    return 1\n```", "After ```inline``` code", "end"])
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><h1>Code</h1><pre><code>def f():\n\n    return 1\n</code></pre><p>After <code>inline</code> code</p><p>end</p></div>",
+        )
+
+    def test_unclosed_fence_splits_like_plain_text(self):
+        md = "# T\n\n```python\nx = 1\n\n## Next section\n\nSome _text_ here."
+        self.assertEqual(markdown_to_blocks(md), ["# T", "```python\nx = 1", "## Next section", "Some _text_ here."])
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><h1>T</h1><p><code>python x = 1</code></p><h2>Next section</h2><p>Some <i>text</i> here.</p></div>",
+        )
+        # Without a line ending in ```, nothing is a fence and every input splits as it always did
+        rng = random.Random(7)
+        alphabet = ["a", " ", "\n", "\n\n", "# h", "```py", "```", "`"]
+        for _ in range(2000):
+            markdown = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+            if any(line.rstrip().endswith("```") for line in markdown.split("\n")):
+                continue
+            expected = [block.strip() for block in markdown.split("\n\n") if block.strip() != ""]
+            self.assertEqual(markdown_to_blocks(markdown), expected, markdown)
+
+    def test_reads_lazily_from_a_file(self):
+        consumed = []
+
+        def lines():
+            for line in ["# Title\n", "\n", "one\n", "\n", "two\n"]:
+                consumed.append(line)
+                yield line
+
+        blocks = iter_markdown_blocks(lines())
+        self.assertEqual(next(blocks), "# Title")
+        self.assertEqual(len(consumed), 2)
+        self.assertEqual(list(blocks), ["one", "two"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "page.md")
+            template = os.path.join(tmp, "template.html")
+            dest = os.path.join(tmp, "out", "page.html")
+            with open(source, "w") as f:
+                f.write("Intro\n\n# Title\n\n```\nx\n\ny\n```\n")
+            with open(template, "w") as f:
+                f.write("{{ Title }}|{{ Content }}|{{ Content }}")
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_page(source, template, dest, "/")
+            with open(dest) as f:
+                content = "<div><p>Intro</p><h1>Title</h1><pre><code>x\n\ny\n</code></pre></div>"
+                self.assertEqual(f.read(), f"Title|{content}|{content}")
+
+
 class TestBlockToBlockType(unittest.TestCase):
     def test_heading1(self):
         md = "# Test"
@@ -259,6 +388,27 @@ bla
 """
         self.assertNotEqual(block_to_block_type(md), BlockType.ORDERED_LIST)
 
+    def scanned(self, markdown):
+        if re.match(r'#+ ', markdown[:7]):
+            return BlockType.HEADING
+        elif markdown.split("\n")[0].startswith('```') and markdown.split("\n")[-1].endswith('```'):
+            return BlockType.CODE
+        elif all([piece.startswith('>') for piece in markdown.split("\n")]):
+            return BlockType.QUOTE
+        elif all([piece.startswith('- ') for piece in markdown.split("\n")]):
+            return BlockType.UNORDERED_LIST
+        elif all([line.split(". ")[0].isdigit() and int(line.split(". ")[0]) == i+1 for i, line in enumerate(markdown.split("\n")) if line.strip()]):
+            return BlockType.ORDERED_LIST
+        else:
+            return BlockType.PARAGRAPH
+
+    def test_matches_per_type_scans(self):
+        rng = random.Random(11)
+        lines = ["", "  ", "> q", ">q", "- item", "-item", "1. one", "2. two", "3. three", "12. x", "1.no", "plain", "```", "```py", "code```", "# h", "###### h", "####### h"]
+        for _ in range(3000):
+            block = "\n".join(rng.choice(lines) for _ in range(rng.randint(1, 5)))
+            self.assertEqual(block_to_block_type(block), self.scanned(block), repr(block))
+
 class TestMarkdownToHtmlNode(unittest.TestCase):
     def test_paragraphs(self):
         md = """
@@ -292,6 +442,30 @@ the **same** even with inline stuff
             "<div><pre><code>This is text that _should_ remain\nthe **same** even with inline stuff\n</code></pre></div>",
         )
 
+    def test_lists_and_quotes(self):
+        md = """
+## Heading with **bold**
+
+> first line
+>second _line_
+>
+> third
+
+- one
+- [two](/two)
+
+1. first
+2. second.
+3. 3. third
+"""
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            '<div><h2>Heading with <b>bold</b></h2>'
+            '<blockquote>first line second <i>line</i> third</blockquote>'
+            '<ul><li>one</li><li><a href="/two">two</a></li></ul>'
+            '<ol><li>first</li><li>second.</li><li>3. third</li></ol></div>',
+        )
+
 class TestExtractTitle(unittest.TestCase):
     def test_extract_title1(self):
         md = '# Title'
@@ -310,4 +484,68 @@ class TestExtractTitle(unittest.TestCase):
 # If there is more than one title
 # Use the first title
 """
-        self.assertEqual('If there is more than one title', extract_title(md))
\ No newline at end of file
+        self.assertEqual('If there is more than one title', extract_title(md))
+
+class TestCompiledTemplate(unittest.TestCase):
+    def test_split_template(self):
+        self.assertEqual(
+            split_template("<t>{{ Title }}</t><b>{{ Content }}</b>"),
+            ["<t>", "Title", "</t><b>", "Content", "</b>"],
+        )
+
+    def test_iter_content_html_matches_tree(self):
+        md = "# Head\n\nSome **text** [link](/a)\n\n- one\n- two"
+        self.assertEqual("".join(iter_content_html(markdown_to_blocks(md))), markdown_to_html_node(md).to_html())
+
+    def test_render_matches_replace(self):
+        template = '<title>{{ Title }}</title><link href="/index.css"><body>{{ Content }}</body>'
+        md = "# Hello\n\n![pic](/images/a.png) and [home](/)"
+        expected = template.replace("{{ Title }}", "Hello").replace("{{ Content }}", markdown_to_html_node(md).to_html())
+        expected = expected.replace('href="/', 'href="/base/').replace('src="/', 'src="/base/')
+        compiled = CompiledTemplate(template, "/base/")
+        self.assertEqual(compiled.static[1], '</title><link href="/base/index.css"><body>')
+        out = io.StringIO()
+        compiled.render(out, "Hello", markdown_to_blocks(md))
+        self.assertEqual(out.getvalue(), expected)
+        self.assertEqual(compiled.render_to_string("Hello", markdown_to_blocks(md)), expected)
+
+    def test_load_template_is_cached_until_changed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "template.html")
+            with open(path, "w") as f:
+                f.write("<b>{{ Title }}</b>")
+            first = load_template(path, "/")
+            self.assertIs(load_template(path, "/"), first)
+            self.assertIsNot(load_template(path, "/other/"), first)
+            with open(path, "w") as f:
+                f.write("<i>{{ Title }}</i> changed")
+            self.assertEqual(load_template(path, "/").render_to_string("x", []), "<i>x</i> changed")
+
+class TestDiscoverContent(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        for relative in ["index.md", "notes.md.bak", "blog/post.md", "blog/template.html", "blog/pic.png", "drafts/wip.md"]:
+            self.write(os.path.join(self.content, *relative.split("/")), "# x")
+
+    def discover(self, **kwargs):
+        return [(kind, os.path.relpath(src, self.content), os.path.relpath(dst, "out"), template and os.path.basename(os.path.dirname(template)))
+                for kind, src, dst, template in discover_content(self.content, "out", "template.html", **kwargs)]
+
+    def test_discovers_pages_and_copies(self):
+        self.assertEqual(self.discover(), [
+            ("page", "index.md", "index.html", ""),
+            ("copy", "notes.md.bak", "notes.md.bak", None),
+            ("copy", os.path.join("blog", "pic.png"), os.path.join("blog", "pic.png"), None),
+            ("page", os.path.join("blog", "post.md"), os.path.join("blog", "post.html"), "blog"),
+            ("page", os.path.join("drafts", "wip.md"), os.path.join("drafts", "wip.html"), ""),
+        ])
+
+    def test_is_lazy(self):
+        jobs = discover_content(self.content, "out", "template.html")
+        self.assertEqual(next(jobs)[0], "page")
+
+    def test_include_and_exclude(self):
+        self.assertEqual([src for _, src, _, _ in self.discover(include=["*.md"], exclude=["drafts"])], ["index.md", os.path.join("blog", "post.md")])
+        self.assertTrue(is_content_included("blog/post.md", ["*.md"], ["drafts"]))
+        self.assertFalse(is_content_included("drafts/wip.md", None, ["drafts"]))
+        self.assertFalse(is_content_included("blog/pic.png", ["*.md"], None))
@@ -1,3 +1,4 @@
+import io
 import unittest
 
 from htmlnode import HTMLNode, LeafNode, ParentNode
@@ -44,4 +45,25 @@ class TestHTMLNode(unittest.TestCase):
     def test_to_html_with_children_props(self):
         child_node = LeafNode("span", "child", {"href": "https://www.google.com"})
         parent_node = ParentNode("div", [child_node])
-        self.assertEqual(parent_node.to_html(), '<div><span href="https://www.google.com">child</span></div>')
\ No newline at end of file
+        self.assertEqual(parent_node.to_html(), '<div><span href="https://www.google.com">child</span></div>')
+
+    def test_to_html_deep_tree(self):
+        node = LeafNode("b", "leaf")
+        for _ in range(5000):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<span>" * 5000 + "<b>leaf</b></span>"))
+        self.assertEqual(len(html), 5000 * len("<span></span>") + len("<b>leaf</b>"))
+
+    def test_write_html_streams_to_file(self):
+        node = ParentNode("ul", [ParentNode("li", [LeafNode(None, "one")]), ParentNode("li", [LeafNode("a", "two", {"href": "/x"})])], {"class": "list"})
+        out = io.StringIO()
+        node.write_html(out)
+        self.assertEqual(out.getvalue(), node.to_html())
+        self.assertEqual(out.getvalue(), '<ul class="list"><li>one</li><li><a href="/x">two</a></li></ul>')
+
+    def test_parent_without_children_raises(self):
+        with self.assertRaises(ValueError):
+            ParentNode("div", [LeafNode("b", "ok"), ParentNode("p", None)]).to_html()
+        with self.assertRaises(NotImplementedError):
+            HTMLNode("p", "text").to_html()
@@ -0,0 +1,138 @@
+import contextlib
+import io
+import os
+import struct
+import unittest
+import zlib
+
+from images import Image, image_size, derivative_name, derivative_widths, image_props, process_images, scan_images
+from functions import markdown_to_html_node, rewrite_basepath, set_asset_table, set_image_table, set_block_cache
+from incremental import generate_pages_incremental
+from render_cache import BlockCache
+from sitetest import SiteTestCase
+
+
+def png_bytes(width, height):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + b"\x80\x40\x20" * width for _ in range(height))
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+class TestImages(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.static, "images"))
+
+    def tearDown(self):
+        set_image_table(None)
+        set_asset_table(None)
+        set_block_cache(None)
+        super().tearDown()
+
+    def test_image_size_from_headers(self):
+        png = os.path.join(self.static, "images", "tom.png")
+        self.write(png, png_bytes(40, 30))
+        self.assertEqual(image_size(png), (40, 30))
+        # SOI, an APP0 segment to skip, then a baseline frame header
+        jpeg = os.path.join(self.static, "images", "tom.jpg")
+        self.write(jpeg, b"\xff\xd8" + b"\xff\xe0\x00\x04ab" + b"\xff\xc0\x00\x11\x08" + struct.pack(">HH", 300, 640) + b"\x00" * 12)
+        self.assertEqual(image_size(jpeg), (640, 300))
+        self.write(png, b"not an image")
+        with self.assertRaises(ValueError):
+            image_size(png)
+        # Cut off inside the frame header
+        self.write(jpeg, b"\xff\xd8\xff\xc0\x00\x11\x08\x01")
+        with self.assertRaises(ValueError):
+            image_size(jpeg)
+
+    def test_unreadable_images_are_reported_not_fatal(self):
+        self.write(os.path.join(self.static, "images", "tom.png"), png_bytes(40, 30))
+        self.write(os.path.join(self.static, "images", "broken.png"), b"<html>not found</html>")
+        files, stats = scan_images(self.static, {"files": {}})
+        self.assertEqual(list(files), ["images/tom.png"])
+        self.assertEqual([relative for relative, _ in stats["errors"]], ["images/broken.png"])
+
+    def test_names_and_props(self):
+        self.assertEqual(derivative_widths(1000, (1600, 480, 960, 480)), [480, 960])
+        self.assertEqual(derivative_name("images/tom.png", 480, "0123456789abcdef"), "images/tom-480w.0123456789.png")
+        entry = {"width": 1000, "height": 500}
+        self.assertEqual(image_props("images/tiny.png", entry, []), {"width": 1000, "height": 500})
+        props = image_props("images/tom.png", entry, [(480, "images/tom-480w.h.png")])
+        self.assertEqual(props["srcset"], "/images/tom-480w.h.png 480w, /images/tom.png 1000w")
+
+    def test_img_tags_get_size_and_srcset(self):
+        markdown = "![Tom](/images/tom.png) and ![remote](https://example.com/x.png)"
+        plain = markdown_to_html_node(markdown).to_html()
+        set_image_table({"images/tom.png": image_props("images/tom.png", {"width": 1000, "height": 500}, [(480, "images/tom-480w.h.png")])})
+        html = markdown_to_html_node(markdown).to_html()
+        self.assertEqual(
+            html,
+            '<div><p><img src="/images/tom.png" alt="Tom" width="1000" height="500" srcset="/images/tom-480w.h.png 480w, /images/tom.png 1000w" sizes="100vw"></img>'
+            ' and <img src="https://example.com/x.png" alt="remote"></img></p></div>',
+        )
+        self.assertEqual(
+            rewrite_basepath(html, "/site/"),
+            html.replace('src="/', 'src="/site/').replace("/images/tom-", "/site/images/tom-").replace(", /images/", ", /site/images/"),
+        )
+        set_asset_table({"images/tom.png": "images/tom.abc.png"})
+        self.assertIn('srcset="/site/images/tom-480w.h.png 480w, /site/images/tom.abc.png 1000w"', rewrite_basepath(html, "/site/"))
+
+        # Image blocks stay out of the block cache while a table is installed, so it never serves them stale
+        cache = BlockCache()
+        set_block_cache(cache)
+        markdown_to_html_node(markdown)
+        set_image_table(None)
+        self.assertEqual(markdown_to_html_node(markdown).to_html(), plain)
+
+    def test_new_image_table_rerenders_incremental_pages(self):
+        content = os.path.join(self.root, "content")
+        template = os.path.join(self.root, "template.html")
+        manifest = os.path.join(self.root, "cache", "manifest.json")
+        self.write(template, b"{{ Content }}")
+        self.write(os.path.join(content, "index.md"), b"# Tom\n\n![Tom](/images/tom.png)")
+
+        def build(table):
+            set_image_table(table)
+            with contextlib.redirect_stdout(io.StringIO()):
+                return generate_pages_incremental(content, template, self.docs, "/", manifest)
+
+        self.assertEqual(build(None)["rendered"], 1)
+        self.assertEqual(build(None)["rendered"], 0)
+        self.assertEqual(build({"images/tom.png": {"width": 10, "height": 5}})["rendered"], 1)
+        with open(os.path.join(self.docs, "index.html")) as f:
+            self.assertIn('width="10" height="5"', f.read())
+
+    @unittest.skipIf(Image is not None, "Pillow is installed")
+    def test_missing_pillow_is_an_error(self):
+        with self.assertRaises(ValueError):
+            process_images(self.static, self.docs)
+
+    @unittest.skipIf(Image is None, "Pillow is not installed")
+    def test_derivatives_are_cached_by_source_hash(self):
+        state = os.path.join(self.root, "cache", "images.json")
+        store = os.path.join(self.root, "cache", "images")
+        tom = os.path.join(self.static, "images", "tom.png")
+        self.write(tom, png_bytes(64, 32))
+        self.write(os.path.join(self.static, "images", "tiny.png"), png_bytes(8, 8))
+
+        table, stats = process_images(self.static, self.docs, (16, 32, 128), 2, state, store)
+        self.assertEqual((stats["resized"], stats["written"], stats["errors"]), (2, 2, []))
+        self.assertEqual(table["images/tiny.png"], {"width": 8, "height": 8})
+        names = [candidate.split(" ")[0][1:] for candidate in table["images/tom.png"]["srcset"].split(", ")]
+        self.assertEqual(names[-1], "images/tom.png")
+        with Image.open(os.path.join(self.docs, *names[0].split("/"))) as image:
+            self.assertEqual(image.size, (16, 8))
+
+        _, stats = process_images(self.static, self.docs, (16, 32, 128), 2, state, store)
+        self.assertEqual((stats["hashed"], stats["resized"], stats["reused"], stats["written"]), (0, 0, 2, 0))
+
+        self.write(tom, png_bytes(64, 64))
+        table, stats = process_images(self.static, self.docs, (16, 32, 128), 2, state, store)
+        self.assertEqual((stats["resized"], stats["removed"]), (2, 2))
+        self.assertFalse(os.path.exists(os.path.join(self.docs, *names[0].split("/"))))
+        self.assertEqual(len(os.listdir(store)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import unittest
+
+from incremental import generate_pages_incremental, load_manifest
+from sitetest import SiteTestCase
+
+
+TEMPLATE = "<title>{{ Title }}</title><body>{{ Content }}</body>"
+
+
+class TestGeneratePagesIncremental(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manifest = self.path("cache", "manifest.json")
+        os.makedirs(os.path.join(self.content, "blog"))
+        self.write(self.template, TEMPLATE)
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nHello")
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nWorld")
+
+    def build(self, basepath="/"):
+        return generate_pages_incremental(self.content, self.template, self.docs, basepath, self.manifest)
+
+    def test_first_build_renders_everything(self):
+        stats = self.build()
+        self.assertEqual(stats["rendered"], 2)
+        self.assertTrue(os.path.isfile(os.path.join(self.docs, "blog", "post.html")))
+        self.assertEqual(len(load_manifest(self.manifest)["sources"]), 2)
+
+    def test_unchanged_pages_are_skipped(self):
+        self.build()
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nHello again")
+        stats = self.build()
+        self.assertEqual(stats["rendered"], 1)
+        self.assertEqual(stats["skipped"], 1)
+
+    def test_template_or_basepath_change_rebuilds_all(self):
+        self.build()
+        self.assertEqual(self.build(basepath="/site/")["rendered"], 2)
+        self.write(self.template, TEMPLATE + "\n")
+        self.assertEqual(self.build(basepath="/site/")["rendered"], 2)
+
+    def test_directory_template_change_rebuilds_subtree(self):
+        self.build()
+        self.write(os.path.join(self.content, "blog", "template.html"), "<main>{{ Content }}</main>")
+        stats = self.build()
+        self.assertEqual(stats["rendered"], 1)
+        with open(os.path.join(self.docs, "blog", "post.html")) as f:
+            self.assertEqual(f.read(), "<main><div><h1>Post</h1><p>World</p></div></main>")
+
+    def test_deleted_source_removes_output(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "post.md"))
+        stats = self.build()
+        self.assertEqual(stats["removed"], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "blog", "post.html")))
+        self.assertTrue(os.path.exists(os.path.join(self.docs, "index.html")))
+
+
+if __name__ == "__main__":
+    unittest.main()
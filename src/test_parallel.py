@@ -0,0 +1,70 @@
+import os
+import unittest
+
+from functions import generate_pages_recursive
+from parallel import collect_page_jobs, generate_pages_parallel
+from sitetest import SiteTestCase
+
+
+TEMPLATE = '<title>{{ Title }}</title><link href="/index.css"><body>{{ Content }}</body>'
+
+
+class TestParallelPages(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.content, "blog", "deep"))
+        self.write(self.template, TEMPLATE)
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n- [a](/blog)\n- **b**")
+        self.write(os.path.join(self.content, "blog", "index.md"), "# Blog\n\n![img](/images/x.png)")
+        self.write(os.path.join(self.content, "blog", "deep", "page.md"), "# Deep\n\n```\ncode\n```")
+        self.write(os.path.join(self.content, "blog", "notes.txt"), "plain file")
+
+    def read_tree(self, root):
+        files = {}
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                with open(path, "rb") as f:
+                    files[os.path.relpath(path, root)] = f.read()
+        return files
+
+    def test_collect_page_jobs(self):
+        pages, copies = collect_page_jobs(self.content, "out", self.template)
+        self.assertEqual(len(pages), 3)
+        self.assertIn((os.path.join(self.content, "blog", "deep", "page.md"), os.path.join("out", "blog", "deep", "page.html"), self.template), pages)
+        self.assertEqual(copies, [(os.path.join(self.content, "blog", "notes.txt"), os.path.join("out", "blog", "notes.txt"))])
+
+    def test_matches_serial_output(self):
+        serial = self.path("serial")
+        parallel = self.path("parallel")
+        generate_pages_recursive(self.content, self.template, serial, "/base/")
+        errors = generate_pages_parallel(self.content, self.template, parallel, "/base/", workers=2)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.read_tree(serial), self.read_tree(parallel))
+
+    def test_directory_template_override(self):
+        override = os.path.join(self.content, "blog", "template.html")
+        self.write(override, "<main>{{ Content }}</main>")
+        pages, copies = collect_page_jobs(self.content, "out", self.template)
+        templates = {os.path.relpath(src, self.content): template for src, _, template in pages}
+        self.assertEqual(templates["index.md"], self.template)
+        self.assertEqual(templates[os.path.join("blog", "deep", "page.md")], override)
+        self.assertNotIn(override, [src for src, _ in copies])
+
+        serial = self.path("serial")
+        parallel = self.path("parallel")
+        generate_pages_recursive(self.content, self.template, serial, "/")
+        generate_pages_parallel(self.content, self.template, parallel, "/", workers=2)
+        self.assertEqual(self.read_tree(serial), self.read_tree(parallel))
+        self.assertEqual(self.read_tree(serial)[os.path.join("blog", "index.html")], b'<main><div><h1>Blog</h1><p><img src="/images/x.png" alt="img"></img></p></div></main>')
+
+    def test_errors_are_reported_per_file(self):
+        bad = os.path.join(self.content, "blog", "untitled.md")
+        self.write(bad, "no title here")
+        errors = generate_pages_parallel(self.content, self.template, self.path("out"), "/", workers=2)
+        self.assertEqual([source for source, _ in errors], [bad])
+        self.assertIn("no title detected", errors[0][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
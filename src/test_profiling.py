@@ -0,0 +1,47 @@
+import json
+import os
+import unittest
+
+from functions import generate_page, new_page_profile
+from parallel import generate_pages_parallel
+from profiling import BuildProfiler, PAGE_STAGES
+from sitetest import SiteTestCase
+
+
+class TestProfiling(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(self.content)
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nSome **bold** text\n\n- one\n- two")
+        self.write(os.path.join(self.content, "other.md"), "# Other")
+
+    def test_generate_page_fills_profile(self):
+        profile = new_page_profile()
+        dest = self.path("out", "index.html")
+        generate_page(os.path.join(self.content, "index.md"), self.template, dest, "/", profile)
+        self.assertEqual(set(profile["stages"]), set(PAGE_STAGES))
+        self.assertEqual(profile["bytes"], os.path.getsize(dest))
+        # h1 + text, p + 3 leaves, ul + 2 * (li + text)
+        self.assertEqual(profile["nodes"], 2 + 4 + 5)
+        self.assertGreaterEqual(profile["total"], sum(profile["stages"].values()) * 0.99)
+
+    def test_profiler_report_and_json(self):
+        profiler = BuildProfiler()
+        with profiler.stage("pages"):
+            generate_pages_parallel(self.content, self.template, self.path("out"), "/", workers=1, profiler=profiler)
+        totals = profiler.totals()
+        self.assertEqual(totals["pages"], 2)
+        self.assertIn("pages", profiler.build_stages)
+        self.assertIn("Slowest 10 pages:", profiler.report())
+
+        path = self.path("stats.json")
+        profiler.write_json(path)
+        with open(path) as f:
+            stats = json.load(f)
+        self.assertEqual(sorted(stats["slowest"]), sorted(profiler.pages))
+        self.assertEqual(stats["totals"]["nodes"], totals["nodes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from collections import OrderedDict
+from functions import markdown_to_blocks, iter_content_html, set_block_cache
+from render_cache import BlockCache
+
+
+class TestBlockCache(unittest.TestCase):
+    def test_lru_eviction_and_stats(self):
+        cache = BlockCache(max_entries=2)
+        cache.put(("paragraph", "a"), "<p>a</p>")
+        cache.put(("paragraph", "b"), "<p>b</p>")
+        self.assertEqual(cache.get(("paragraph", "a")), "<p>a</p>")
+        cache.put(("paragraph", "c"), "<p>c</p>")
+        self.assertIsNone(cache.get(("paragraph", "b")))
+        self.assertEqual(cache.get(("paragraph", "c")), "<p>c</p>")
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_eviction_during_a_lookup_waits_for_the_lock(self):
+        # The dev server's request threads share one cache. Another thread stores a block that
+        # evicts the key get() just found, right before get() moves it to the end.
+        cache = BlockCache(max_entries=1)
+        cache.put(("paragraph", "a"), "<p>a</p>")
+        intruders = []
+
+        class Entries(OrderedDict):
+            def move_to_end(self, key, last=True):
+                if not intruders:
+                    intruder = threading.Thread(target=cache.put, args=(("paragraph", "b"), "<p>b</p>"))
+                    intruders.append(intruder)
+                    intruder.start()
+                    # Without the lock the put finishes here and the move below raises KeyError
+                    intruder.join(0.2)
+                super().move_to_end(key, last)
+
+        cache.entries = Entries(cache.entries)
+        self.assertEqual(cache.get(("paragraph", "a")), "<p>a</p>")
+        intruders[0].join()
+        self.assertEqual(list(cache.entries), [("paragraph", "b")])
+
+    def test_cached_rendering_matches_uncached(self):
+        md = "# Title\n\nShared **footer** [link](/a)\n\n- one\n- two\n\nShared **footer** [link](/a)"
+        blocks = markdown_to_blocks(md)
+        expected = "".join(iter_content_html(blocks))
+        cache = BlockCache()
+        previous = set_block_cache(cache)
+        try:
+            self.assertEqual("".join(iter_content_html(blocks)), expected)
+            self.assertEqual("".join(iter_content_html(blocks)), expected)
+        finally:
+            set_block_cache(previous)
+        self.assertEqual((cache.hits, cache.misses), (5, 3))
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache", "blocks.json")
+            cache = BlockCache(max_entries=10, path=path)
+            cache.put(("heading", "# a"), "<h1>a</h1>")
+            cache.save()
+            loaded = BlockCache.load(path, max_entries=10)
+            self.assertEqual(loaded.get(("heading", "# a")), "<h1>a</h1>")
+
+            # A cache written by different renderer code is ignored
+            with open(path) as f:
+                data = json.load(f)
+            data["renderer"] = "something else"
+            with open(path, "w") as f:
+                json.dump(data, f)
+            self.assertEqual(len(BlockCache.load(path).entries), 0)
+            self.assertEqual(len(BlockCache.load(os.path.join(tmp, "missing.json")).entries), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
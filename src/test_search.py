@@ -0,0 +1,115 @@
+import contextlib
+import io
+import json
+import os
+import unittest
+
+from functions import generate_pages_recursive, set_text_collector
+from parallel import generate_pages_parallel
+from search import SearchCollector, SearchIndex, update_search_index, encode_postings, decode_postings, tokenize
+from sitetest import SiteTestCase
+from watch import SiteWatcher
+
+
+class TestPostings(unittest.TestCase):
+    def test_round_trip(self):
+        page_ids = [0, 3, 4, 200, 70000]
+        self.assertEqual(decode_postings(encode_postings(reversed(page_ids))), page_ids)
+        self.assertEqual(decode_postings(encode_postings([])), [])
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Tom's **Bombadil**, a 3rd-age x"), ["tom", "bombadil", "3rd", "age"])
+
+
+class TestSearchIndex(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.state = self.path("cache", "search.json")
+        os.makedirs(os.path.join(self.content, "blog"))
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome to **Rivendell**\n\n- [Elrond](/blog/elrond)")
+        self.write(os.path.join(self.content, "blog", "elrond.md"), "# Elrond\n\nLord of _Rivendell_")
+
+    def tearDown(self):
+        set_text_collector(None)
+        super().tearDown()
+
+    def build(self, render):
+        collector = SearchCollector()
+        set_text_collector(collector)
+        with contextlib.redirect_stdout(io.StringIO()):
+            render()
+        set_text_collector(None)
+        present = {source: page["output"] for source, page in collector.pages.items()}
+        return update_search_index(collector, present, self.docs, "/", self.state)
+
+    def lookup(self, term):
+        search_dir = os.path.join(self.docs, "search")
+        with open(os.path.join(search_dir, "index.json")) as f:
+            pages = json.load(f)["pages"]
+        shard = os.path.join(search_dir, term[:2] + ".json")
+        if not os.path.isfile(shard):
+            return []
+        with open(shard) as f:
+            encoded = json.load(f).get(term)
+        return [] if encoded is None else sorted(pages[page_id][0] for page_id in decode_postings(encoded))
+
+    def test_terms_from_render(self):
+        stats = self.build(lambda: generate_pages_recursive(self.content, self.template, self.docs, "/"))
+        self.assertEqual(stats["pages"], 2)
+        self.assertEqual(self.lookup("rivendell"), ["/", "/blog/elrond.html"])
+        self.assertEqual(self.lookup("welcome"), ["/"])
+        self.assertEqual(self.lookup("elrond"), ["/", "/blog/elrond.html"])
+
+    def test_workers_collect_too(self):
+        self.build(lambda: generate_pages_parallel(self.content, self.template, self.docs, "/", workers=2))
+        self.assertEqual(self.lookup("lord"), ["/blog/elrond.html"])
+
+    def test_incremental_update_rewrites_only_changed_shards(self):
+        render = lambda: generate_pages_recursive(self.content, self.template, self.docs, "/")
+        self.build(render)
+        elrond = os.path.join(self.content, "blog", "elrond.md")
+        self.write(elrond, "# Elrond\n\nLord of _Imladris_")
+        collector = SearchCollector()
+        collector.index_file(elrond, os.path.join(self.docs, "blog", "elrond.html"))
+        present = {os.path.join(self.content, "index.md"): os.path.join(self.docs, "index.html"), elrond: os.path.join(self.docs, "blog", "elrond.html")}
+        stats = update_search_index(collector, present, self.docs, "/", self.state)
+        # "im" gains imladris and "ri" loses one posting for rivendell
+        self.assertEqual(stats["written"], 2)
+        self.assertEqual(self.lookup("imladris"), ["/blog/elrond.html"])
+        self.assertEqual(self.lookup("rivendell"), ["/"])
+
+        # A page the index has never seen is parsed even though the build skipped it
+        other = os.path.join(self.content, "other.md")
+        self.write(other, "# Other\n\nMordor")
+        present[other] = os.path.join(self.docs, "other.html")
+        update_search_index(SearchCollector(), present, self.docs, "/", self.state)
+        self.assertEqual(self.lookup("mordor"), ["/other.html"])
+
+        del present[other]
+        update_search_index(SearchCollector(), present, self.docs, "/", self.state)
+        self.assertEqual(self.lookup("mordor"), [])
+        self.assertEqual(len(SearchIndex.load(self.state).pages), 2)
+
+    def test_watcher_keeps_the_index_current(self):
+        self.build(lambda: generate_pages_recursive(self.content, self.template, self.docs, "/"))
+        watcher = SiteWatcher(self.content, self.static, self.template, self.docs, "/", search_state_path=self.state)
+        set_text_collector(SearchCollector())
+        elrond = os.path.join(self.content, "blog", "elrond.md")
+        self.write(elrond, "# Elrond\n\nLord of _Imladris_")
+        stat = os.stat(elrond)
+        os.utime(elrond, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(watcher.poll(), [])
+        self.assertEqual(self.lookup("imladris"), ["/blog/elrond.html"])
+        self.assertEqual(self.lookup("rivendell"), ["/"])
+
+        os.remove(elrond)
+        with contextlib.redirect_stdout(io.StringIO()):
+            watcher.poll()
+        self.assertEqual(self.lookup("lord"), [])
+        self.assertEqual(len(SearchIndex.load(self.state).pages), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
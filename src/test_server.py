@@ -0,0 +1,102 @@
+import contextlib
+import io
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from urllib.request import urlopen
+from render_cache import BlockCache
+from server import DevServer, start_server, stop_server, LIVE_RELOAD_SCRIPT
+from sitetest import SiteTestCase
+
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+class TestDevServer(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.content, "blog"))
+        os.makedirs(self.static)
+        self.write(self.template, '<title>{{ Title }}</title><body><a href="/">home</a>{{ Content }}</body>')
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "blog", "index.md"), "# Blog")
+        self.write(os.path.join(self.content, "blog", "photo.png"), "png")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.site = DevServer(self.content, self.static, self.template, "/site/")
+
+    def test_resolve(self):
+        self.assertEqual(self.site.resolve("/site/"), ("page", os.path.join(self.content, "index.md")))
+        self.assertEqual(self.site.resolve("/site/blog/index.html?x=1"), ("page", os.path.join(self.content, "blog", "index.md")))
+        self.assertEqual(self.site.resolve("/site/blog"), ("redirect", "/site/blog/"))
+        self.assertEqual(self.site.resolve("/site/blog/photo.png"), ("file", os.path.join(self.content, "blog", "photo.png")))
+        self.assertEqual(self.site.resolve("/site/index.css"), ("file", os.path.join(self.static, "index.css")))
+        self.assertIsNone(self.site.resolve("/site/index.md"))
+        self.assertIsNone(self.site.resolve("/site/../template.html"))
+        self.assertIsNone(self.site.resolve("/index.css"))
+
+    def test_render_is_cached_until_source_changes(self):
+        source = os.path.join(self.content, "index.md")
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            html = self.site.render(source)
+            self.assertIs(self.site.render(source), html)
+        self.assertEqual(html, '<title>Home</title><body><a href="/site/">home</a><div><h1>Home</h1></div>' + LIVE_RELOAD_SCRIPT + "</body>")
+        self.assertEqual(out.getvalue().count("Rendering"), 1)
+
+        self.write(source, "# Home again")
+        os.utime(source, ns=(0, 0))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIn("<h1>Home again</h1>", self.site.render(source))
+
+    def test_serves_pages_and_pushes_reloads(self):
+        self.site.interval = 0.01
+        httpd = start_server(self.site, port=0)
+        base = f"http://127.0.0.1:{httpd.server_address[1]}/site/"
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                with urlopen(base + "blog/") as response:
+                    self.assertIn("<h1>Blog</h1>", response.read().decode())
+                with urlopen(base + "index.css") as response:
+                    self.assertEqual(response.read(), b"body {}")
+
+                while self.site.snapshot is None:
+                    time.sleep(0.01)
+                messages = []
+                with urlopen(f"http://127.0.0.1:{httpd.server_address[1]}/__livereload", timeout=5) as events:
+                    reader = threading.Thread(target=lambda: messages.append(events.readline()))
+                    reader.start()
+                    self.write(os.path.join(self.static, "new.css"), "p {}")
+                    reader.join(5)
+                self.assertEqual(messages, [b"data: reload\n"])
+        finally:
+            stop_server(self.site, httpd)
+
+    def test_serve_from_the_command_line(self):
+        # Nothing is written while serving, so options that work on the output are refused
+        result = subprocess.run([sys.executable, MAIN, "--serve", "--search", "--port", "0"], cwd=self.root, capture_output=True, text=True, timeout=10)
+        self.assertEqual(result.returncode, 2)
+        self.assertIn("--search cannot be combined with --serve", result.stderr)
+
+        cache_file = self.path("cache", "blocks.json")
+        process = subprocess.Popen([sys.executable, "-u", MAIN, "/site/", "--serve", "--port", "0", "--block-cache-file", cache_file], cwd=self.root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            line = process.stdout.readline()
+            while line and not line.startswith("Serving"):
+                line = process.stdout.readline()
+            url = line.split(" at ")[1].split()[0]
+            with urlopen(url + "blog/") as response:
+                self.assertIn("<h1>Blog</h1>", response.read().decode())
+        finally:
+            process.send_signal(signal.SIGINT)
+            out, _ = process.communicate(timeout=10)
+        self.assertEqual(process.returncode, 0)
+        self.assertIn("Block cache:", out)
+        self.assertGreater(len(BlockCache.load(cache_file).entries), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from functions import discover_content, set_content_shard
+from incremental import hash_file
+from shard import ContentShard, assign_shards, parse_shard, merge_shards, SHARD_MANIFEST_NAME
+from sitetest import SiteTestCase
+
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+class TestShardPlan(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for text in ("0/4", "5/4", "1/0", "a/b", "3"):
+            with self.assertRaises(ValueError):
+                parse_shard(text)
+
+    def test_assignment_is_balanced_and_deterministic(self):
+        sizes = {"a.md": 10, "b.md": 9, "c.md": 5, "d.md": 4, "e.md": 1, "f.md": 1}
+        assignment = assign_shards(sizes, 2)
+        self.assertEqual(assignment, assign_shards(dict(reversed(list(sizes.items()))), 2))
+        loads = [sum(size for name, size in sizes.items() if assignment[name] == index) for index in (1, 2)]
+        self.assertEqual(sorted(loads), [15, 15])
+        # More shards than files leaves some empty
+        self.assertEqual(sorted(assign_shards({"a.md": 1}, 3).values()), [1])
+
+    def test_shards_partition_the_discovered_content(self):
+        with tempfile.TemporaryDirectory() as content:
+            os.makedirs(os.path.join(content, "blog"))
+            for name, size in (("index.md", 50), ("blog/a.md", 400), ("blog/b.md", 300), ("blog/photo.png", 20), ("blog/c.md", 90)):
+                with open(os.path.join(content, *name.split("/")), "w") as f:
+                    f.write("x" * size)
+            everything = list(discover_content(content, "docs", "template.html"))
+            shards = [ContentShard(index, 3) for index in (1, 2, 3)]
+            parts = []
+            try:
+                for shard in shards:
+                    set_content_shard(shard)
+                    parts.append(list(discover_content(content, "docs", "template.html")))
+            finally:
+                set_content_shard(None)
+            self.assertEqual(sorted(item for part in parts for item in part), sorted(everything))
+            self.assertEqual(len({shard.plan for shard in shards}), 1)
+            self.assertEqual([len(part) for part in parts], [1, 1, 3])
+
+
+class TestShardedBuild(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        files = {
+            "template.html": '<link href="/index.css"><title>{{ Title }}</title>{{ Content }}',
+            "static/index.css": "body {}",
+            "content/index.md": "# Home\n\n[Blog](/blog/)",
+            "content/blog/index.md": "# Blog\n\n" + "words " * 200,
+            "content/blog/post.md": "# Post\n\n- one\n- two",
+            "content/blog/photo.png": "png",
+            "content/about/index.md": "# About\n\n> quoted",
+        }
+        for name, text in files.items():
+            self.write(self.path(*name.split("/")), text)
+
+    def main(self, *args):
+        return subprocess.run([sys.executable, MAIN, "/site/", *args], cwd=self.root, capture_output=True, text=True)
+
+    def tree(self, directory):
+        files = {}
+        for path, _, names in os.walk(os.path.join(self.root, directory)):
+            for name in names:
+                files[os.path.relpath(os.path.join(path, name), os.path.join(self.root, directory))] = hash_file(os.path.join(path, name))
+        return files
+
+    def test_merged_shards_match_a_full_build(self):
+        # Each shard is its own process, as it would be on its own node
+        shards = [subprocess.Popen([sys.executable, MAIN, "/site/", "--shard", f"{index}/3", "--fingerprint"], cwd=self.root, stdout=subprocess.DEVNULL) for index in (1, 2, 3)]
+        self.assertEqual([process.wait() for process in shards], [0, 0, 0])
+        merged = self.main("--merge", "shards/1-of-3", "shards/2-of-3", "shards/3-of-3", "--output", "merged")
+        self.assertEqual(merged.returncode, 0, merged.stderr)
+        self.assertEqual(self.main("--fingerprint").returncode, 0)
+        self.assertEqual(self.tree("merged"), self.tree("docs"))
+        self.assertNotIn(SHARD_MANIFEST_NAME, self.tree("merged"))
+
+    def test_merge_refuses_conflicts_and_missing_shards(self):
+        for index in (1, 2):
+            self.assertEqual(self.main("--shard", f"{index}/2").returncode, 0)
+        shard_dirs = [os.path.join(self.root, "shards", f"{index}-of-2") for index in (1, 2)]
+
+        missing = self.main("--merge", "shards/1-of-2")
+        self.assertEqual(missing.returncode, 1)
+        self.assertIn("expected shards 1 to 2 once each", missing.stderr)
+
+        # Both shards publish static/; a copy that differs is a conflict even when its own manifest agrees
+        css = os.path.join(shard_dirs[1], "index.css")
+        with open(css, "w") as f:
+            f.write("body { color: red }")
+        manifest_path = os.path.join(shard_dirs[1], SHARD_MANIFEST_NAME)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        manifest["files"]["index.css"] = hash_file(css)
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+        with self.assertRaisesRegex(ValueError, "index.css differs between"):
+            merge_shards(shard_dirs, os.path.join(self.root, "merged"))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "merged")))
+
+    def test_shard_rejects_incremental(self):
+        result = self.main("--shard", "1/2", "--incremental")
+        self.assertEqual(result.returncode, 2)
+        self.assertIn("--shard cannot be combined with --incremental", result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
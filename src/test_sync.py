@@ -0,0 +1,55 @@
+import os
+import unittest
+
+from sync import sync_static
+from sitetest import SiteTestCase
+
+
+class TestSyncStatic(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.state = self.path("cache", "static.json")
+        os.makedirs(os.path.join(self.static, "images"))
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.write(os.path.join(self.static, "images", "a.png"), "png bytes")
+
+    def sync(self, **kwargs):
+        return sync_static(self.static, self.docs, self.state, **kwargs)
+
+    def test_first_sync_copies_everything(self):
+        stats = self.sync()
+        self.assertEqual((stats["copied"], stats["copied_bytes"]), (2, len("body {}") + len("png bytes")))
+        with open(os.path.join(self.docs, "images", "a.png")) as f:
+            self.assertEqual(f.read(), "png bytes")
+
+    def test_unchanged_files_are_skipped(self):
+        self.sync()
+        self.write(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        stats = self.sync()
+        self.assertEqual((stats["copied"], stats["skipped"], stats["skipped_bytes"]), (1, 1, len("png bytes")))
+
+    def test_checksum_skips_touched_files(self):
+        self.sync()
+        path = os.path.join(self.static, "index.css")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(self.sync(checksum=True)["copied"], 0)
+        self.assertEqual(self.sync()["copied"], 0)
+
+    def test_orphans_removed_but_generated_files_kept(self):
+        self.sync()
+        self.write(os.path.join(self.docs, "index.html"), "generated page")
+        os.remove(os.path.join(self.static, "images", "a.png"))
+        stats = self.sync()
+        self.assertEqual(stats["removed"], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "images", "a.png")))
+        self.assertTrue(os.path.exists(os.path.join(self.docs, "index.html")))
+
+    def test_hardlink(self):
+        self.sync(hardlink=True)
+        self.assertTrue(os.path.samefile(os.path.join(self.static, "index.css"), os.path.join(self.docs, "index.css")))
+        self.assertEqual(self.sync(hardlink=True)["copied"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
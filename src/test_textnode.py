@@ -22,6 +22,17 @@ class TestTextNode(unittest.TestCase):
         node = TextNode("This is a text node", TextType.BOLD)
         node2 = TextNode("This is a text node", TextType.BOLD, "https://www.youtube.com")
         self.assertNotEqual(node, node2)
-     
+
+    def test_text_type_from_value(self):
+        node = TextNode("This is a text node", "bold")
+        self.assertEqual(node, TextNode("This is a text node", TextType.BOLD))
+        self.assertEqual(repr(node), "TextNode(This is a text node, bold, None)")
+
+    def test_slots(self):
+        node = TextNode("This is a text node", TextType.BOLD)
+        self.assertFalse(hasattr(node, "__dict__"))
+        with self.assertRaises(AttributeError):
+            node.extra = 1
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,69 @@
+import os
+import unittest
+
+from parallel import generate_pages_parallel
+from watch import SiteWatcher
+from sitetest import SiteTestCase
+
+
+class TestSiteWatcher(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.content, "blog"))
+        os.makedirs(os.path.join(self.static, "images"))
+        self.write(self.template, "<t>{{ Title }}</t>{{ Content }}")
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post")
+        self.write(os.path.join(self.static, "images", "a.png"), "png")
+        generate_pages_parallel(self.content, self.template, self.docs, "/", workers=1)
+        self.watcher = SiteWatcher(self.content, self.static, self.template, self.docs, "/")
+
+    def write(self, path, text):
+        super().write(path, text)
+        # Force a visible mtime change even on filesystems with coarse timestamps
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def read(self, *parts):
+        with open(os.path.join(self.docs, *parts)) as f:
+            return f.read()
+
+    def test_no_changes(self):
+        self.assertEqual(self.watcher.poll(), [])
+
+    def test_changed_page_is_rerendered(self):
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Edited")
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self.read("blog", "post.html"), "<t>Edited</t><div><h1>Edited</h1></div>")
+
+    def test_template_change_rerenders_all_pages(self):
+        self.write(self.template, "<T>{{ Title }}</T>")
+        self.watcher.poll()
+        self.assertEqual(self.read("index.html"), "<T>Home</T>")
+        self.assertEqual(self.read("blog", "post.html"), "<T>Post</T>")
+
+    def test_directory_template_is_used(self):
+        self.write(os.path.join(self.content, "blog", "template.html"), "<blog>{{ Title }}</blog>")
+        self.watcher.poll()
+        self.assertEqual(self.read("blog", "post.html"), "<blog>Post</blog>")
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "blog", "template.html")))
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Again")
+        self.watcher.poll()
+        self.assertEqual(self.read("blog", "post.html"), "<blog>Again</blog>")
+
+    def test_static_and_removed_files(self):
+        self.write(os.path.join(self.static, "images", "b.png"), "new png")
+        self.watcher.poll()
+        self.assertEqual(self.read("images", "b.png"), "new png")
+        os.remove(os.path.join(self.content, "blog", "post.md"))
+        self.watcher.poll()
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "blog", "post.html")))
+
+    def test_errors_are_returned(self):
+        self.write(os.path.join(self.content, "index.md"), "no title")
+        errors = self.watcher.poll()
+        self.assertEqual([source for source, _ in errors], [os.path.join(self.content, "index.md")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,9 +9,12 @@ class TextType(Enum):
     IMAGE = "image"
 
 class TextNode():
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text, text_type, url=None):
         self.text = text
-        self.text_type = TextType(text_type)
+        # TextType(...) is a slow call even for a member; the parser always passes members
+        self.text_type = text_type if type(text_type) is TextType else TextType(text_type)
         self.url = url
 
     def __eq__(self, other):
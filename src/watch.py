@@ -0,0 +1,147 @@
+import os
+import shutil
+import time
+
+from functions import generate_page, get_precompressor, get_text_collector, page_template, is_page_source, page_output_name, is_content_included, TEMPLATE_NAME
+from parallel import collect_page_jobs, render_page_jobs
+from search import update_search_index, DEFAULT_SEARCH_STATE_PATH
+
+
+def scan_tree(root):
+    files = {}
+    if not os.path.isdir(root):
+        return files
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def diff_snapshots(old, new):
+    changed = [path for path, version in new.items() if old.get(path) != version]
+    removed = [path for path in old if path not in new]
+    return changed, removed
+
+
+class SiteWatcher():
+    def __init__(self, content_dir, static_dir, template_path, dest_dir, basepath, workers=1, interval=0.2, include=None, exclude=None, search_state_path=DEFAULT_SEARCH_STATE_PATH):
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.template_path = template_path
+        self.dest_dir = dest_dir
+        self.basepath = basepath
+        self.workers = workers
+        self.interval = interval
+        self.include = include
+        self.exclude = exclude
+        self.search_state_path = search_state_path
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = scan_tree(self.content_dir)
+        snapshot.update(scan_tree(self.static_dir))
+        if os.path.isfile(self.template_path):
+            stat = os.stat(self.template_path)
+            snapshot[self.template_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def page_template(self, src):
+        return page_template(self.content_dir, self.template_path, src)
+
+    def destination(self, path):
+        if self.is_content(path):
+            relative = os.path.relpath(path, self.content_dir)
+            directory, item = os.path.split(relative)
+            if is_page_source(item):
+                item = page_output_name(item)
+            return os.path.join(self.dest_dir, directory, item)
+        return os.path.join(self.dest_dir, os.path.relpath(path, self.static_dir))
+
+    def is_content(self, path):
+        return os.path.commonpath([os.path.abspath(path), os.path.abspath(self.content_dir)]) == os.path.abspath(self.content_dir)
+
+    def is_page(self, path):
+        return self.is_content(path) and is_page_source(os.path.basename(path))
+
+    def is_included(self, path):
+        if not self.is_content(path):
+            return True
+        relative = os.path.relpath(path, self.content_dir).replace(os.sep, "/")
+        return is_content_included(relative, self.include, self.exclude)
+
+    def is_template(self, path):
+        return path == self.template_path or (self.is_content(path) and os.path.basename(path) == TEMPLATE_NAME)
+
+    def rebuild_all_pages(self):
+        pages, _ = collect_page_jobs(self.content_dir, self.dest_dir, self.template_path, self.include, self.exclude)
+        return render_page_jobs(pages, self.basepath, self.workers)
+
+    def update_search(self, collector):
+        # The collector picked up every page rendered since the last update
+        pages, _ = collect_page_jobs(self.content_dir, self.dest_dir, self.template_path, self.include, self.exclude)
+        present = {src: dst for src, dst, _ in pages}
+        stats = update_search_index(collector, present, self.dest_dir, self.basepath, self.search_state_path)
+        print(f"Search index: {stats['pages']} pages, {stats['written']} shards written")
+
+    def apply(self, changed, removed):
+        errors = []
+        precompressor = get_precompressor()
+        collector = get_text_collector()
+        pages_changed = any(self.is_page(path) or self.is_template(path) for path in changed + removed)
+        if any(self.is_template(path) for path in changed + removed):
+            errors.extend(self.rebuild_all_pages())
+            changed = [path for path in changed if not self.is_page(path)]
+        for path in changed:
+            if self.is_template(path) or not self.is_included(path):
+                continue
+            dest = self.destination(path)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            if self.is_page(path):
+                try:
+                    generate_page(path, self.page_template(path), dest, self.basepath)
+                except Exception as e:
+                    errors.append((path, f"{type(e).__name__}: {e}"))
+            else:
+                print(f"Copying {path} to {dest}")
+                shutil.copy(path, dest)
+                if precompressor is not None:
+                    precompressor.submit(dest)
+        for path in removed:
+            if self.is_template(path) or not self.is_included(path):
+                continue
+            dest = self.destination(path)
+            if os.path.isfile(dest):
+                print(f"Removing {dest}")
+                os.remove(dest)
+            if precompressor is not None:
+                precompressor.forget(dest)
+        if collector is not None and pages_changed:
+            self.update_search(collector)
+        return errors
+
+    def poll(self):
+        snapshot = self.scan()
+        changed, removed = diff_snapshots(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        errors = self.apply(changed, removed) if changed or removed else []
+        precompressor = get_precompressor()
+        if precompressor is not None:
+            errors.extend(precompressor.take_finished())
+        return errors
+
+    def run(self, on_errors=None):
+        print(f"Watching {self.content_dir}, {self.static_dir} and {self.template_path} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(self.interval)
+                errors = self.poll()
+                if errors and on_errors is not None:
+                    on_errors(errors)
+        except KeyboardInterrupt:
+            pass